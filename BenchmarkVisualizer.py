@@ -0,0 +1,379 @@
+# Python 3
+#
+# Benchmark the hot paths of the visualizer on synthetic results
+#
+# A results tree is generated for every point of the scaling curves, over
+# the number of loops per benchmark and over the number of runs. On each
+# tree getCdfs, the ResultProvider accessors, the display_page routes and
+# the Dash callbacks are timed, the first (cold) call separately from the
+# repeated (warm) ones. The timings are written as json so that runs of the
+# harness can be compared, e.g.
+#
+#   python3 BenchmarkVisualizer.py --loops 10 40 160 --dates 2 8 32 -o bench.json
+#
+# With --compare the warm timings are checked against the json of an
+# earlier run, and the harness exits with 1 if any benchmark got slower by
+# more than --tolerance, e.g.
+#
+#   python3 BenchmarkVisualizer.py --compare bench.json --tolerance 0.2
+#
+# With --generate_only PATH the synthetic tree is only written to PATH.
+
+import argparse
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import tempfile
+import statistics
+import plotly.utils
+
+import VisualizeCoverage
+import ResultPresenter
+
+# runs read by the pages, they are generated in every tree
+PAGE_DATES = ['2019-04-28', '2019-05-20', '2019-05-22', '2019-06-04', '2019-06-06',
+              '2019-06-08', '2019-06-27', '2019-07-01', '2019-07-02', '2019-07-06',
+              '2019-07-08', '2019-07-26', '2019-07-27', '2019-07-28', '2019-07-30',
+              '2019-08-05', '2019-08-05-12-41', '2019-08-05-16-14', '2019-08-05-18-54',
+              '2019-08-06-02-43', '2019-08-06-15-03', '2019-08-07-00-38', '2019-08-09-01-52',
+              '2019-08-10-02-33', '2019-08-11-02-09', '2019-08-13-21-23', '2019-08-13-22-41',
+              '2019-08-14-14-27', '2020-08-14-00-17', '2021-02-22-12-22', '2021-03-01-00-19',
+              '2021-03-04-00-18', '2021-03-05-00-19', '2021-03-07-00-19', '2021-03-09-00-20',
+              '2021-03-11-00-20', '2021-03-15-19-31', '2021-03-16-01-20', '2021-03-18-01-21',
+              '2021-03-26-01-54', '2021-10-25-21-23', '2022-09-12-18-02']
+# slowdowns smaller than this are noise, whatever the ratio
+COMPARE_MIN_SECONDS = 0.001
+# benchmarks read by the pages
+PAGE_BMARKS = ["correlation", "2mm", "3mm", "covariance", "gemm", "doitgen", "swaptions",
+               "blackscholes", "052.alvinn", "enc-md5", "dijkstra-dynsize", "179.art"]
+
+DEP_TYPES = ["RAW", "WAW", "WAR", "CTRL"]
+PASSES = ["Loop", "Edge", "SLAMP", "Exp-slamp", "Exp-ignorefn"]
+PER_BMARK_EXPS = ["Experiment", "Experiment-no-spec", "Experiment-no-specpriv", "Exp-slamp"]
+
+
+def getRunDates(numDates):
+    # the status and coverage pages only list runs after these dates
+    return ["2023-01-%02d-%02d-00" % (1 + i // 24, i % 24) for i in range(numDates)]
+
+
+def getLoopName(bmark, i):
+    return "%s::loop%d" % (bmark, i)
+
+
+def getInstruction(rnd, i):
+    op = rnd.choice(["load", "store", "call"])
+    if op == "load":
+        return "  %%%d = load i32, i32* %%arrayidx%d, align 4" % (i, rnd.randrange(64))
+    if op == "store":
+        return "  store i32 %%%d, i32* %%arrayidx%d, align 4" % (i, rnd.randrange(64))
+    return "  call void @f%d(i8* %%%d)" % (rnd.randrange(16), i)
+
+
+def getSlampLoops(rnd, bmark, numLoops, numDeps):
+    loops = {}
+    for i in range(numLoops):
+        deps = []
+        for j in range(numDeps):
+            deps.append({"type": rnd.choice(DEP_TYPES),
+                         "src": getInstruction(rnd, j), "srcId": rnd.randrange(10000),
+                         "dst": getInstruction(rnd, j + 1), "dstId": rnd.randrange(10000)})
+        covered = rnd.randrange(numDeps + 1)
+        loops[getLoopName(bmark, i)] = {
+            "debug_info": "%s.c:%d" % (bmark, 10 * i),
+            "exec_coverage": round(rnd.uniform(0, 100), 2),
+            "loop_stage": rnd.choice(["P22", "S-P", "S-P-S", "DOALL"]),
+            "loop_speedup": round(rnd.uniform(1, 20), 2),
+            "slamp": rnd.choice([True, False]),
+            "covered_lcDeps": covered,
+            "total_lcDeps": numDeps,
+            "lcDeps_coverage": round(100 * covered / numDeps, 2) if numDeps else 100,
+            "blocking_deps": deps}
+    return loops
+
+
+def getBmarkStatus(rnd, bmark, numLoops):
+    status = {}
+    for exp in PER_BMARK_EXPS:
+        loops = {}
+        for i in range(numLoops):
+            loops[getLoopName(bmark, i)] = {"selected": rnd.random() < 0.3,
+                                            "exec_coverage": round(rnd.uniform(0, 30), 2),
+                                            "loop_speedup": round(rnd.uniform(1, 20), 2),
+                                            "loop_stage": rnd.choice(["P22", "S-P22-S"])}
+        status[exp] = {"speedup": round(rnd.uniform(0.5, 20), 3), "loops": loops}
+    return status
+
+
+def getRunStatus(rnd, bmarks, numLoops, numDeps):
+    status = {}
+    for bmark in bmarks:
+        seq_time = rnd.uniform(10, 100)
+        para_time_dict = {str(cores): seq_time / (1 + cores * rnd.uniform(0.3, 0.9))
+                          for cores in range(1, 29)}
+        para_time = para_time_dict["28"]
+        bmark_status = {p: True for p in PASSES}
+        bmark_status["Exp-slamp"] = {"loops": getSlampLoops(rnd, bmark, numLoops, numDeps)}
+        bmark_status["Exp-ignorefn"] = rnd.random() < 0.5
+        bmark_status["RealSpeedup"] = {"seq_time": seq_time, "para_time": para_time,
+                                       "speedup": seq_time / para_time,
+                                       "para_time_dict": para_time_dict}
+        status[bmark] = bmark_status
+    return status
+
+
+# coverage.json, sccs.json and compatible.json of a run, density is the
+# probability that two loops are compatible
+def getCoverageInputs(rnd, bmarks, numLoops, density):
+    coverages, sccs, compatibles = {}, {}, {}
+    for bmark in bmarks:
+        coverages[bmark] = [round(rnd.uniform(0, 30), 2) for _ in range(numLoops)]
+        compatibles[bmark] = [[i, j] for i in range(numLoops) for j in range(i + 1, numLoops)
+                              if rnd.random() < density]
+        for name in [bmark, bmark + "-ignorefn"]:
+            sccs[name] = [[rnd.randrange(101), 0, 0] for _ in range(numLoops)]
+    return coverages, sccs, compatibles
+
+
+def writeJson(path, obj):
+    with open(path, 'w') as fd:
+        json.dump(obj, fd)
+
+
+# Write a results tree under root/results with the runs of the pages and
+# numDates runs for the status and coverage pages, each with numBmarks
+# benchmarks (besides the ones of the pages) of numLoops loops
+def generateResults(root, numDates, numBmarks, numLoops, numDeps, density, seed=0):
+    rnd = random.Random(seed)
+    result_path = os.path.join(root, "results")
+    bmarks = PAGE_BMARKS + ["bmark%d" % i for i in range(numBmarks)]
+
+    for date in PAGE_DATES + getRunDates(numDates):
+        date_path = os.path.join(result_path, date)
+        os.makedirs(date_path)
+        writeJson(os.path.join(date_path, "status.json"),
+                  getRunStatus(rnd, bmarks, numLoops, numDeps))
+        for bmark in bmarks:
+            writeJson(os.path.join(date_path, "status_%s.json" % bmark),
+                      getBmarkStatus(rnd, bmark, numLoops))
+        writeJson(os.path.join(result_path, date + ".log"), {"memo": "synthetic run " + date})
+
+    for date in getRunDates(numDates):
+        date_path = os.path.join(result_path, date)
+        for filename, obj in zip(VisualizeCoverage.BMARK_FILES,
+                                 getCoverageInputs(rnd, bmarks, numLoops, density)):
+            writeJson(os.path.join(date_path, filename), obj)
+
+    return result_path
+
+
+# Time fn, the first call separately from the next repeat ones. The result
+# of route and callback layouts is serialized like Dash does.
+def timeCall(fn, repeat, serialize=False):
+    times = []
+    for _ in range(repeat + 1):
+        start = time.perf_counter()
+        result = fn()
+        if serialize:
+            json.dumps(result, cls=plotly.utils.PlotlyJSONEncoder)
+        times.append(time.perf_counter() - start)
+    # without warm calls the first one stands for them
+    warm = times[1:] or times
+    return {"first": times[0], "median": statistics.median(warm), "min": min(warm)}
+
+
+def getBenchmarks(resultProvider, root_path, numDates):
+    date = getRunDates(numDates)[-1]
+    dates = getRunDates(numDates)
+    bmark = PAGE_BMARKS[0]
+    loop = getLoopName(bmark, 0)
+    coverage_path = os.path.join(root_path, "results", date)
+    dep_type = sorted(resultProvider.getDepGroups(date, bmark, loop))[0]
+
+    def solveCdfs():
+        coverages, sccs, compatibles = VisualizeCoverage.openBmarkFileFiles(coverage_path)
+        return VisualizeCoverage.getCdfs(coverages, sccs, compatibles)
+
+    def getDeps():
+        return resultProvider.getDepGroups(date, bmark, loop)[dep_type]
+
+    benchmarks = [
+        ("getCdfs", solveCdfs, False),
+        ("ResultProvider.getRuns", resultProvider.getRuns, False),
+        ("ResultProvider.getMemos", lambda: resultProvider.getMemos(dates), False),
+        ("ResultProvider.getBmarks", lambda: resultProvider.getBmarks(date), False),
+        ("ResultProvider.getPassFlags", lambda: resultProvider.getPassFlags(date), False),
+        ("ResultProvider.getRunSummary", lambda: resultProvider.getRunSummary(date), False),
+        ("ResultProvider.getLoopRows", lambda: resultProvider.getLoopRows(date), False),
+        ("ResultProvider.getDepGroups", lambda: resultProvider.getDepGroups(date, bmark, loop), False),
+        ("ResultProvider.highlightDeps", lambda: resultProvider.highlightDeps(getDeps()), False),
+        ("ResultProvider.getRunTables", lambda: resultProvider.getRunTables(dates), False),
+        ("ResultProvider.getSequentialData",
+         lambda: resultProvider.getSequentialData(PAGE_BMARKS, dates), False),
+        ("ResultProvider.getParallelData",
+         lambda: resultProvider.getParallelData(PAGE_BMARKS, dates), False),
+        ("ResultProvider.getRealSpeedup",
+         lambda: resultProvider.getRealSpeedup(PAGE_BMARKS, dates), False),
+        ("ResultProvider.getMultiCoreData",
+         lambda: resultProvider.getMultiCoreData(PAGE_BMARKS, dates), False),
+        ("ResultProvider.getLoopData", lambda: resultProvider.getLoopData(bmark), False),
+        ("ResultProvider.getSpeedupExp3", lambda: resultProvider.getSpeedupExp3(dates, 1.0), False),
+        ("ResultProvider.getSpeedupData", lambda: resultProvider.getSpeedupData(dates, 1.0), False),
+        ("ResultProvider.computeCdfs", lambda: resultProvider.computeCdfs(date), False),
+    ]
+
+    for route in ["/status", "/multiCore", "/realSpeedup", "/estimatedSpeedup",
+                  "/estimatedSpeedup-exp3", "/coverage", "/comparePrivateer", "/bmark_" + bmark]:
+        benchmarks.append(("display_page " + route,
+                           lambda route=route: ResultPresenter.display_page(route), True))
+
+    benchmarks += [
+        ("update_status_summary", lambda: ResultPresenter.update_status_summary(date), True),
+        ("update_loop_table",
+         lambda: ResultPresenter.update_loop_table(date, None, None, 0, None,
+                                                   [{"column_id": "exec_coverage", "direction": "desc"}],
+                                                   "{exec_coverage} > 10"), True),
+        ("update_deps_table",
+         lambda: ResultPresenter.update_deps_table(dep_type, 0, date, bmark, loop), True),
+        ("getStatusTable", lambda: ResultPresenter.getStatusTable(date, bmark, loop), True),
+        ("getCoverageLayout", lambda: ResultPresenter.getCoverageLayout(date), True),
+    ]
+    return benchmarks
+
+
+# generate a tree and time all benchmarks on it
+def runPoint(args, numDates, numLoops):
+    root_path = tempfile.mkdtemp(prefix="AutoParVisualizer-bench-")
+    try:
+        start = time.perf_counter()
+        generateResults(root_path, numDates, args.bmarks, numLoops, args.deps,
+                        args.density, args.seed)
+        generate_time = time.perf_counter() - start
+
+        app = ResultPresenter.setupApp(root_path, stream_mb=args.stream_mb, indexer=False,
+                                       cache_dir=os.path.join(root_path, "cache"),
+                                       load_workers=args.load_workers)
+        timings = {}
+        for name, fn, serialize in getBenchmarks(app._resultProvider, root_path, numDates):
+            try:
+                timings[name] = timeCall(fn, args.repeat, serialize)
+            except Exception as e:
+                timings[name] = {"error": repr(e)}
+            print("%-40s %s" % (name, timings[name]), file=sys.stderr)
+    finally:
+        shutil.rmtree(root_path, ignore_errors=True)
+
+    return {"dates": numDates, "loops": numLoops, "generate": generate_time, "timings": timings}
+
+
+# {benchmark: [[x, median], ...]} of the points along one axis
+def getCurve(points, axis):
+    curve = {}
+    for point in points:
+        for name, timing in point["timings"].items():
+            if "median" in timing:
+                curve.setdefault(name, []).append([point[axis], timing["median"]])
+    return curve
+
+
+# Slowdowns of the warm timings of result against baseline, the points are
+# matched by their number of runs and loops. A benchmark failing only in
+# result is a slowdown too.
+def compareResults(baseline, result, tolerance):
+    old_points = {(point["dates"], point["loops"]): point for point in baseline["points"]}
+    slowdowns = []
+    for point in result["points"]:
+        old_point = old_points.get((point["dates"], point["loops"]))
+        if old_point is None:
+            print("compare: no baseline for %d dates %d loops" % (point["dates"], point["loops"]),
+                  file=sys.stderr)
+            continue
+        for name, timing in point["timings"].items():
+            old = old_point["timings"].get(name)
+            if old is None or "median" not in old:
+                continue
+            if "median" not in timing:
+                slowdowns.append((point["dates"], point["loops"], name, old["median"], None))
+                continue
+            if (timing["median"] > old["median"] * (1 + tolerance)
+                    and timing["median"] - old["median"] > COMPARE_MIN_SECONDS):
+                slowdowns.append((point["dates"], point["loops"], name, old["median"],
+                                  timing["median"]))
+    return slowdowns
+
+
+def parseArgs():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dates", type=int, nargs="+", default=[2, 8],
+                        help="Numbers of runs besides the ones of the pages, a scaling point each")
+    parser.add_argument("--loops", type=int, nargs="+", default=[10, 40],
+                        help="Numbers of loops per benchmark, a scaling point each")
+    parser.add_argument("--bmarks", type=int, default=8,
+                        help="Number of benchmarks besides the ones of the pages")
+    parser.add_argument("--deps", type=int, default=20,
+                        help="Number of blocking dependencies per loop")
+    parser.add_argument("--density", type=float, default=0.3,
+                        help="Probability that two loops are compatible")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Number of warm calls timed after the first one")
+    parser.add_argument("--stream_mb", type=int, default=64,
+                        help="Read status files larger than this (in MB) incrementally")
+    parser.add_argument("--load_workers", type=int, default=8,
+                        help="Number of runs loaded at once")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", type=str, default=None,
+                        help="Json file of the results, stdout by default")
+    parser.add_argument("--compare", type=str, default=None,
+                        help="Json file of an earlier run, exit with 1 on a slowdown against it")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Relative slowdown of a warm timing allowed by --compare")
+    parser.add_argument("--generate_only", type=str, default=None,
+                        help="Only generate a results tree of the first scaling point under this root")
+    args = parser.parse_args()
+    if args.repeat < 0:
+        parser.error("--repeat must not be negative")
+
+    return args
+
+
+if __name__ == '__main__':
+    args = parseArgs()
+    if args.generate_only:
+        generateResults(args.generate_only, args.dates[0], args.bmarks, args.loops[0],
+                        args.deps, args.density, args.seed)
+        sys.exit(0)
+
+    # the pages read prior_results.json from the working directory
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    # loops scale with the first number of runs, runs with the first
+    # number of loops
+    loop_points = [runPoint(args, args.dates[0], loops) for loops in args.loops]
+    date_points = loop_points[:1] + [runPoint(args, dates, args.loops[0]) for dates in args.dates[1:]]
+
+    result = {"config": vars(args),
+              "points": loop_points + date_points[1:],
+              "curves": {"loops": getCurve(loop_points, "loops"),
+                         "dates": getCurve(date_points, "dates")}}
+    if args.output:
+        writeJson(args.output, result)
+    else:
+        print(json.dumps(result, indent=2))
+
+    if args.compare:
+        with open(args.compare, 'r') as fd:
+            baseline = json.load(fd)
+        slowdowns = compareResults(baseline, result, args.tolerance)
+        for dates, loops, name, old, new in slowdowns:
+            if new is None:
+                print("slowdown: %d dates %d loops %-40s %.4fs -> failed" % (dates, loops, name, old),
+                      file=sys.stderr)
+            else:
+                print("slowdown: %d dates %d loops %-40s %.4fs -> %.4fs (%+.0f%%)" % (
+                    dates, loops, name, old, new, (new / old - 1) * 100), file=sys.stderr)
+        if slowdowns:
+            sys.exit(1)
+        print("compare: no slowdown beyond %.0f%%" % (args.tolerance * 100), file=sys.stderr)
@@ -0,0 +1,111 @@
+# Python 3
+#
+# Incremental access to very large json files
+#
+# The file is memory-mapped and the members of an object are located by
+# scanning strings and brackets, without decoding the values that are
+# skipped. Only the value asked for is passed to json.loads.
+
+import re
+import json
+import mmap
+import contextlib
+import ResultMetrics
+
+_WS = re.compile(rb'[ \t\n\r]*')
+_STRING = re.compile(rb'"(?:[^"\\]|\\.)*"')
+# strings are matched whole so that brackets inside them are skipped
+_TOKEN = re.compile(rb'"(?:[^"\\]|\\.)*"|[\[\]{}]')
+_SCALAR = re.compile(rb'[^,:\[\]{}\s]+')
+
+_OPEN = (ord('{'), ord('['))
+_CLOSE = (ord('}'), ord(']'))
+
+
+@contextlib.contextmanager
+def openJson(path):
+    with open(path, 'rb') as fd:
+        with mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            yield buf
+
+
+def skipWhitespace(buf, pos):
+    return _WS.match(buf, pos).end()
+
+
+# end offset of the value starting at pos
+def skipValue(buf, pos):
+    c = buf[pos]
+    if c == ord('"'):
+        return _STRING.match(buf, pos).end()
+    if c not in _OPEN:
+        return _SCALAR.match(buf, pos).end()
+
+    depth = 0
+    for m in _TOKEN.finditer(buf, pos):
+        c = buf[m.start()]
+        if c in _OPEN:
+            depth += 1
+        elif c in _CLOSE:
+            depth -= 1
+            if depth == 0:
+                return m.end()
+    raise ValueError("Unterminated json value at %d" % pos)
+
+
+# (key, start, end) of each member of the object starting at pos
+def iterMembers(buf, pos):
+    pos = skipWhitespace(buf, pos)
+    if buf[pos] != ord('{'):
+        raise ValueError("Expected json object at %d" % pos)
+    pos = skipWhitespace(buf, pos + 1)
+    if buf[pos] == ord('}'):
+        return
+
+    while True:
+        m = _STRING.match(buf, pos)
+        if m is None:
+            raise ValueError("Expected json key at %d" % pos)
+        key = json.loads(m.group())
+        pos = skipWhitespace(buf, m.end())
+        if buf[pos] != ord(':'):
+            raise ValueError("Expected ':' at %d" % pos)
+        start = skipWhitespace(buf, pos + 1)
+        end = skipValue(buf, start)
+        yield key, start, end
+
+        pos = skipWhitespace(buf, end)
+        if buf[pos] == ord(','):
+            pos = skipWhitespace(buf, pos + 1)
+        elif buf[pos] == ord('}'):
+            return
+        else:
+            raise ValueError("Expected ',' or '}' at %d" % pos)
+
+
+# (start, end) of the value at the path of keys, KeyError if missing
+def findPath(buf, keys, pos=0):
+    start, end = skipWhitespace(buf, pos), None
+    for key in keys:
+        if buf[start] != ord('{'):
+            raise KeyError(key)
+        for member, member_start, member_end in iterMembers(buf, start):
+            if member == key:
+                start, end = member_start, member_end
+                break
+        else:
+            raise KeyError(key)
+    if end is None:
+        end = skipValue(buf, start)
+    return start, end
+
+
+# {field: value} of the given fields of the object at pos, the other
+# members are skipped without being decoded
+def loadFields(buf, pos, fields):
+    result = {}
+    for name, start, end in iterMembers(buf, pos):
+        if name in fields:
+            ResultMetrics.countBytes("stream", end - start)
+            result[name] = json.loads(buf[start:end])
+    return result
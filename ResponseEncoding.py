@@ -0,0 +1,180 @@
+# Python 3
+#
+# Compact encoding of the responses of the result presenter
+#
+# Numeric trace arrays of the figures are rounded to a configurable number
+# of decimals and, if the plotly.js bundled with Dash can decode them, sent
+# as base64 typed arrays instead of float text. Responses are compressed
+# with flask-compress if installed, otherwise with gzip (or brotli if the
+# brotli module is installed) by an after_request hook.
+
+import os
+import re
+import gzip
+import base64
+import numpy as np
+
+# plotly.js decodes {"dtype": ..., "bdata": ...} arrays since this version
+TYPED_ARRAY_PLOTLY_JS = (2, 28)
+# trace attributes that are encoded
+ARRAY_KEYS = ("x", "y", "z")
+INT_DTYPES = [(np.int8, "i1"), (np.uint8, "u1"), (np.int16, "i2"), (np.uint16, "u2"),
+              (np.int32, "i4")]
+COMPRESSED_MIMETYPES = {"application/json", "text/html", "text/plain", "text/css",
+                        "application/javascript", "text/javascript"}
+
+# decimals trace values are rounded to, None keeps them as they are
+PRECISION = 4
+# None detects the support of the bundled plotly.js
+TYPED_ARRAYS = None
+
+
+def configure(precision=4, typedArrays=None):
+    global PRECISION, TYPED_ARRAYS
+    PRECISION = precision
+    TYPED_ARRAYS = typedArrays
+
+
+# settings the encoded figures depend on, part of the key of cached figures
+def getSettingsKey():
+    return "precision=%s;typedArrays=%s" % (PRECISION, useTypedArrays())
+
+
+# (major, minor) of the plotly.js bundled with dash, None if unknown
+def getPlotlyJsVersion():
+    try:
+        from dash import dcc
+        with open(os.path.join(os.path.dirname(dcc.__file__), "plotly.min.js"), 'r') as fd:
+            head = fd.read(256)
+    except (ImportError, OSError):
+        return None
+    m = re.search(r"plotly\.js v(\d+)\.(\d+)", head)
+    return (int(m.group(1)), int(m.group(2))) if m else None
+
+
+def useTypedArrays():
+    global TYPED_ARRAYS
+    if TYPED_ARRAYS is None:
+        version = getPlotlyJsVersion()
+        TYPED_ARRAYS = version is not None and version >= TYPED_ARRAY_PLOTLY_JS
+    return TYPED_ARRAYS
+
+
+def decodeTypedArray(value):
+    array = np.frombuffer(base64.b64decode(value["bdata"]), dtype=value["dtype"])
+    if "shape" in value:
+        shape = value["shape"]
+        if isinstance(shape, str):
+            shape = [int(n) for n in shape.split(",")]
+        array = array.reshape(shape)
+    return array
+
+
+def encodeTypedArray(values):
+    if values.dtype.kind in "iu" and len(values):
+        low, high = values.min(), values.max()
+        for dtype, name in INT_DTYPES:
+            info = np.iinfo(dtype)
+            if info.min <= low and high <= info.max:
+                return {"dtype": name, "bdata": base64.b64encode(values.astype(dtype).tobytes()).decode()}
+    # float32 keeps about 7 significant digits, enough once rounded
+    dtype, name = (np.float32, "f4") if PRECISION is not None else (np.float64, "f8")
+    return {"dtype": name, "bdata": base64.b64encode(values.astype(dtype).tobytes()).decode()}
+
+
+# numeric array of a trace attribute, None if it is not numeric
+def getNumericArray(value):
+    if isinstance(value, dict) and "bdata" in value:
+        return decodeTypedArray(value)
+    if isinstance(value, np.ndarray):
+        return value if value.ndim >= 1 and value.dtype.kind in "iuf" else None
+    if isinstance(value, (list, tuple)) and len(value):
+        if any(v is None or isinstance(v, (str, bool)) for v in value):
+            return None
+        array = np.asarray(value)
+        if array.ndim >= 1 and array.dtype.kind in "iuf":
+            return array
+    return None
+
+
+def compactArray(value):
+    array = getNumericArray(value)
+    if array is None:
+        return value
+    if array.dtype.kind == "f" and PRECISION is not None:
+        array = np.round(array, PRECISION)
+    if useTypedArrays() and array.ndim == 1:
+        return encodeTypedArray(array)
+    return array.tolist()
+
+
+# Figure (a plotly Figure or a figure dict) with the numeric arrays of its
+# traces rounded and encoded, as a json-serializable dict
+def compactFigure(fig):
+    if hasattr(fig, "to_plotly_json"):
+        fig = fig.to_plotly_json()
+    fig = dict(fig)
+    data = []
+    for trace in fig.get("data", []):
+        if hasattr(trace, "to_plotly_json"):
+            trace = trace.to_plotly_json()
+        trace = dict(trace)
+        for key in ARRAY_KEYS:
+            if key in trace:
+                trace[key] = compactArray(trace[key])
+        data.append(trace)
+    fig["data"] = data
+    return fig
+
+
+def getEncoding(acceptEncoding):
+    accepted = [e.split(";")[0].strip() for e in acceptEncoding.lower().split(",")]
+    if "br" in accepted:
+        try:
+            import brotli
+            return "br", brotli.compress
+        except ImportError:
+            pass
+    if "gzip" in accepted:
+        return "gzip", None
+    return None, None
+
+
+# Compress the responses of a Flask server larger than minBytes
+def installCompression(server, level=6, minBytes=1024):
+    if getattr(server, "_autoparCompression", False):
+        return
+    server._autoparCompression = True
+
+    try:
+        from flask_compress import Compress
+        server.config.setdefault("COMPRESS_MIMETYPES", sorted(COMPRESSED_MIMETYPES))
+        server.config.setdefault("COMPRESS_LEVEL", level)
+        server.config.setdefault("COMPRESS_MIN_SIZE", minBytes)
+        Compress(server)
+        return
+    except ImportError:
+        pass
+
+    import flask
+
+    @server.after_request
+    def compressResponse(response):
+        if (response.direct_passthrough or not 200 <= response.status_code < 300
+                or "Content-Encoding" in response.headers
+                or response.mimetype not in COMPRESSED_MIMETYPES):
+            return response
+        encoding, compress = getEncoding(flask.request.headers.get("Accept-Encoding", ""))
+        if encoding is None:
+            return response
+        data = response.get_data()
+        if len(data) < minBytes:
+            return response
+
+        if encoding == "gzip":
+            response.set_data(gzip.compress(data, compresslevel=level))
+        else:
+            response.set_data(compress(data))
+        response.headers["Content-Encoding"] = encoding
+        response.vary.add("Accept-Encoding")
+        return response
@@ -0,0 +1,537 @@
+# Python 3
+#
+# Caches shared by the result presenter
+#
+# Parsed status files are kept in memory so that every page and callback
+# loads a run at most once until the file changes
+
+import os
+import gzip
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+import tempfile
+import threading
+import collections
+from pygments import highlight
+from pygments.lexers.asm import LlvmLexer
+from pygments.formatters import HtmlFormatter
+import JsonStream
+import ResultMetrics
+
+# read once, os.umask can only be read by setting it
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+# Give a file or directory created by tempfile, which are private to the
+# user, the mode of a regular file or directory so that the servers of other
+# users sharing the results tree can read it
+def makeShared(path):
+    mode = 0o777 if os.path.isdir(path) else 0o666
+    os.chmod(path, mode & ~_UMASK)
+
+
+# Parsed json takes several times the size of its file in memory (about 2.7
+# times for a status.json), documents are charged their file size times this
+DOCUMENT_MEMORY_FACTOR = 3
+
+
+class DocumentStore:
+
+    # maxBytes caps the estimated memory of the parsed documents, the least
+    # recently used documents are evicted first
+    def __init__(self, maxBytes=512 * 1024 * 1024):
+        self._maxBytes = maxBytes
+        self._curBytes = 0
+        self._docs = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # Parsed json of the file at path, reloaded when its mtime or size
+    # changes. The returned object is shared, callers must not modify it.
+    def load(self, path):
+        st = os.stat(path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            entry = self._docs.get(path)
+            if entry is not None and entry[0] == stamp:
+                self._docs.move_to_end(path)
+                self.hits += 1
+                ResultMetrics.countCache("documents", "hit")
+                return entry[1]
+            self.misses += 1
+        ResultMetrics.countCache("documents", "miss")
+
+        with open(path, 'r') as fd:
+            doc = json.load(fd)
+        ResultMetrics.countBytes("documents", st.st_size)
+
+        with self._lock:
+            old = self._docs.pop(path, None)
+            if old is not None:
+                self._curBytes -= old[0][1] * DOCUMENT_MEMORY_FACTOR
+
+            # a single document larger than the cap is not kept
+            if st.st_size * DOCUMENT_MEMORY_FACTOR <= self._maxBytes:
+                self._docs[path] = (stamp, doc)
+                self._curBytes += st.st_size * DOCUMENT_MEMORY_FACTOR
+                while self._curBytes > self._maxBytes:
+                    _, (oldStamp, _) = self._docs.popitem(last=False)
+                    self._curBytes -= oldStamp[1] * DOCUMENT_MEMORY_FACTOR
+        return doc
+
+    def clear(self):
+        with self._lock:
+            self._docs.clear()
+            self._curBytes = 0
+
+
+# Index of the status.json and status_<bmark>.json files of each run, a
+# directory is only listed again when its mtime changes
+class StatusIndex:
+
+    def __init__(self):
+        self._listings = {}
+        self._lock = threading.Lock()
+
+    def listStatusFiles(self, date_path):
+        mtime = os.stat(date_path).st_mtime_ns
+        with self._lock:
+            entry = self._listings.get(date_path)
+        if entry is not None and entry[0] == mtime:
+            return entry[1]
+
+        files = []
+        for filename in sorted(os.listdir(date_path)):
+            if filename.endswith(".json") and filename.startswith("status"):
+                bmark = filename.replace("status_", "").replace(".json", "")
+                files.append((bmark, filename))
+
+        with self._lock:
+            self._listings[date_path] = (mtime, files)
+        return files
+
+
+# Sorted catalogue of the runs under the results root that have a
+# status.json. A background thread polls the root, backing off while
+# nothing changes. The root is only listed again when its mtime changes,
+# runs without a status.json yet are checked on every poll.
+class RunCatalog:
+
+    # onPoll, if given, is called with the list of runs by the background
+    # thread after each poll
+    def __init__(self, path, minInterval=1.0, maxInterval=60.0, onPoll=None):
+        self._path = path
+        self._onPoll = onPoll
+        self._minInterval = minInterval
+        self._maxInterval = maxInterval
+        self._rootMtime = None
+        self._runs = []
+        self._pending = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # returns True if the catalogue changed
+    def refresh(self):
+        mtime = os.stat(self._path).st_mtime_ns
+        with self._lock:
+            rootChanged = mtime != self._rootMtime
+            runs = set(self._runs)
+            pending = list(self._pending)
+
+        if rootChanged:
+            # hidden directories hold caches, not runs
+            dirs = [d for d in os.listdir(self._path)
+                    if not d.startswith(".") and os.path.isdir(os.path.join(self._path, d))]
+            runs &= set(dirs)
+            pending = [d for d in dirs if d not in runs]
+
+        finished = [d for d in pending
+                    if os.path.isfile(os.path.join(self._path, d, "status.json"))]
+        if not rootChanged and not finished:
+            return False
+
+        runs.update(finished)
+        with self._lock:
+            self._rootMtime = mtime
+            self._runs = sorted(runs)
+            self._pending = [d for d in pending if d not in runs]
+        return True
+
+    def getRuns(self):
+        if self._thread is None:
+            self.refresh()
+        with self._lock:
+            return list(self._runs)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.refresh()
+        if self._onPoll is not None:
+            self._onPoll(self.getRuns())
+        self._thread = threading.Thread(target=self._poll, name="RunCatalog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _poll(self):
+        interval = self._minInterval
+        while not self._stop.wait(interval):
+            try:
+                changed = self.refresh()
+                if self._onPoll is not None:
+                    self._onPoll(self.getRuns())
+            except (OSError, ValueError) as e:
+                print("RunCatalog: failed to scan", self._path, e)
+                changed = False
+            interval = self._minInterval if changed else min(interval * 2, self._maxInterval)
+
+
+# Memo of each run, from <date>.log or else <date>/config.json. Once
+# revalidate is called by the RunCatalog thread, memos are served from
+# memory only and picked up again by the next poll when their file changes.
+# Until then an entry is checked against the file mtime at most once every
+# ttl seconds.
+class MemoStore:
+
+    def __init__(self, path, ttl=10.0):
+        self._path = path
+        self._ttl = ttl
+        # date: (stamp, memo, time of the last check)
+        self._memos = {}
+        self._background = False
+        self._lock = threading.Lock()
+
+    # the file the memo is read from and its mtime
+    def getStamp(self, date):
+        for log_path in [os.path.join(self._path, date + '.log'),
+                         os.path.join(self._path, date, "config.json")]:
+            try:
+                return log_path, os.stat(log_path).st_mtime_ns
+            except OSError:
+                continue
+        return None, None
+
+    @staticmethod
+    def _readMemo(stamp):
+        if stamp[0] is None:
+            return "No Log File"
+        with open(stamp[0]) as fd:
+            obj = json.load(fd)
+        return obj['memo'] if 'memo' in obj else "No Memo"
+
+    def _getEntry(self, date):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._memos.get(date)
+            if entry is not None and (self._background or now - entry[2] < self._ttl):
+                return entry
+
+        stamp = self.getStamp(date)
+        if entry is not None and entry[0] == stamp:
+            memo = entry[1]
+        else:
+            memo = self._readMemo(stamp)
+
+        entry = (stamp, memo, now)
+        with self._lock:
+            self._memos[date] = entry
+        return entry
+
+    def getMemo(self, date):
+        return self._getEntry(date)[1]
+
+    def getMemos(self, date_list):
+        return [self._getEntry(date)[1] for date in date_list]
+
+    # stamp of the memo served for date
+    def getMemoStamp(self, date):
+        return self._getEntry(date)[0]
+
+    # Check the memo files of all runs of the catalogue, reading the changed
+    # ones. Memos of runs no longer in the catalogue are dropped.
+    def revalidate(self, date_list):
+        now = time.monotonic()
+        with self._lock:
+            old = dict(self._memos)
+        memos = {}
+        for date in date_list:
+            entry = old.get(date)
+            stamp = self.getStamp(date)
+            if entry is None or entry[0] != stamp:
+                try:
+                    entry = (stamp, self._readMemo(stamp), now)
+                except (OSError, ValueError):
+                    # read again, and fail, when the memo is asked for
+                    continue
+            memos[date] = entry
+        with self._lock:
+            self._memos = memos
+            self._background = True
+
+
+# Serialized layouts of pages that only depend on a fixed set of runs. An
+# entry records the runs it was built from and their fingerprint, and is
+# rebuilt once the fingerprint changes. Entries are also written gzipped
+# to cacheDir, so they survive restarts and are shared between processes.
+class FigureCache:
+
+    def __init__(self, cacheDir=None):
+        self._cacheDir = cacheDir
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _filePath(self, page):
+        name = page.strip("/").replace("/", "_") or "index"
+        return os.path.join(self._cacheDir, name + ".json.gz")
+
+    def _loadFile(self, page):
+        try:
+            with gzip.open(self._filePath(page), 'rt') as fd:
+                return json.load(fd)
+        except (OSError, ValueError):
+            return None
+
+    def _saveFile(self, page, entry):
+        tmp_path = None
+        try:
+            os.makedirs(self._cacheDir, exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=self._cacheDir, suffix=".tmp", delete=False) as fd:
+                tmp_path = fd.name
+                with gzip.GzipFile(fileobj=fd, mode='wb') as gz:
+                    gz.write(json.dumps(entry).encode())
+            makeShared(tmp_path)
+            os.replace(tmp_path, self._filePath(page))
+        except OSError:
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    # getKey(runs) fingerprints a list of runs, build() returns the
+    # json-serializable layout and the runs it read
+    def get(self, page, getKey, build):
+        with self._lock:
+            entry = self._entries.get(page)
+        if entry is None and self._cacheDir is not None:
+            entry = self._loadFile(page)
+
+        if entry is not None and getKey(entry["runs"]) == entry["key"]:
+            with self._lock:
+                self._entries[page] = entry
+                self.hits += 1
+            ResultMetrics.countCache("figures", "hit")
+            return entry["layout"]
+
+        layout, runs = build()
+        entry = {"runs": runs, "key": getKey(runs), "layout": layout}
+        with self._lock:
+            self._entries[page] = entry
+            self.misses += 1
+        ResultMetrics.countCache("figures", "miss")
+        if self._cacheDir is not None:
+            self._saveFile(page, entry)
+        return layout
+
+
+# Highlighted HTML of LLVM IR snippets, keyed by the hash of the snippet.
+# One lexer and formatter are shared by all requests, and highlighted
+# snippets are also kept in the shared cache if given.
+class IRHighlighter:
+
+    def __init__(self, maxEntries=65536, shared=None):
+        self._maxEntries = maxEntries
+        self._shared = shared
+        self._lexer = LlvmLexer()
+        self._formatter = HtmlFormatter()
+        self._html = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def getKey(snippet):
+        return hashlib.sha1(snippet.encode()).hexdigest()
+
+    # {snippet: html} for all unique snippets, each highlighted at most once
+    def highlightAll(self, snippets):
+        result = {}
+        new = {}
+        with self._lock:
+            for snippet in snippets:
+                if snippet in result:
+                    continue
+                key = self.getKey(snippet)
+                html = self._html.get(key)
+                if html is None:
+                    if self._shared is not None:
+                        html = self._shared.get("ir:" + key)
+                    if html is None:
+                        html = highlight(snippet, self._lexer, self._formatter)
+                        new["ir:" + key] = html
+                        ResultMetrics.countCache("highlight", "miss")
+                    self._html[key] = html
+                    if len(self._html) > self._maxEntries:
+                        self._html.popitem(last=False)
+                else:
+                    self._html.move_to_end(key)
+                    ResultMetrics.countCache("highlight", "hit")
+                result[snippet] = html
+        if new and self._shared is not None:
+            self._shared.setMany(new)
+        return result
+
+    def highlight(self, snippet):
+        return self.highlightAll([snippet])[snippet]
+
+
+# bump when the layout of the offset index changes
+OFFSET_INDEX_VERSION = 1
+
+
+# Build the offset index of a status.json:
+# {bmark: {exp: {"range": [start, end], "truthy": bool,
+#                "loops": {loop: [start, end]}}}}
+def indexStatus(buf):
+    bmarks = {}
+    for bmark, start, _ in JsonStream.iterMembers(buf, 0):
+        exps = {}
+        bmarks[bmark] = exps
+        if buf[start] != ord('{'):
+            continue
+        for exp, exp_start, exp_end in JsonStream.iterMembers(buf, start):
+            value = buf[exp_start:exp_end]
+            if len(value) < 64:
+                truthy = bool(json.loads(value))
+            else:
+                # only a non-empty container or string is that long
+                truthy = True
+            loops = {}
+            if buf[exp_start] == ord('{'):
+                try:
+                    loops_start, _ = JsonStream.findPath(buf, ["loops"], exp_start)
+                    if buf[loops_start] == ord('{'):
+                        for loop, loop_start, loop_end in JsonStream.iterMembers(buf, loops_start):
+                            loops[loop] = [loop_start, loop_end]
+                except KeyError:
+                    pass
+            exps[exp] = {"range": [exp_start, exp_end], "truthy": truthy, "loops": loops}
+    return bmarks
+
+
+# Offset indexes of status files, kept in a .<name>.index sidecar next to
+# the file and rebuilt when the size or mtime of the file changes
+class OffsetIndexStore:
+
+    def __init__(self):
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def getSidecar(path):
+        return os.path.join(os.path.dirname(path), "." + os.path.basename(path) + ".index")
+
+    # with keep False the index is only written to its sidecar, not kept in
+    # memory
+    def get(self, path, keep=True):
+        st = os.stat(path)
+        stamp = [st.st_size, st.st_mtime_ns, OFFSET_INDEX_VERSION]
+        with self._lock:
+            entry = self._indexes.get(path)
+        if entry is not None and entry["stamp"] == stamp:
+            ResultMetrics.countCache("offsets", "hit")
+            return entry["bmarks"]
+
+        sidecar = self.getSidecar(path)
+        try:
+            with open(sidecar, 'r') as fd:
+                entry = json.load(fd)
+        except (OSError, ValueError):
+            entry = None
+
+        if entry is None or entry.get("stamp") != stamp:
+            ResultMetrics.countCache("offsets", "miss")
+            with JsonStream.openJson(path) as buf:
+                entry = {"stamp": stamp, "bmarks": indexStatus(buf)}
+            ResultMetrics.countBytes("offsets", st.st_size)
+            self._save(sidecar, entry)
+        else:
+            ResultMetrics.countCache("offsets", "sidecar")
+
+        if keep:
+            with self._lock:
+                self._indexes[path] = entry
+        return entry["bmarks"]
+
+    def _save(self, sidecar, entry):
+        tmp_path = None
+        try:
+            with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(sidecar), suffix=".tmp",
+                                             delete=False) as fd:
+                tmp_path = fd.name
+                json.dump(entry, fd)
+            makeShared(tmp_path)
+            os.replace(tmp_path, sidecar)
+        except OSError:
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+# Cache of json-serializable values shared by all server processes on the
+# host, kept in a SQLite database on local disk (not on NFS). Values are
+# stored zlib-compressed and the oldest are pruned beyond maxEntries.
+class SharedCache:
+
+    def __init__(self, path, maxEntries=200000):
+        self._path = path
+        self._maxEntries = maxEntries
+        self._local = threading.local()
+        self._sets = 0
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS cache "
+                         "(key TEXT PRIMARY KEY, value BLOB, stored REAL)")
+
+    # one connection per thread, sqlite connections cannot be shared
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        try:
+            row = self._connect().execute("SELECT value FROM cache WHERE key = ?",
+                                          (key,)).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None:
+            ResultMetrics.countCache("shared", "miss")
+            return None
+        ResultMetrics.countCache("shared", "hit")
+        return json.loads(zlib.decompress(row[0]))
+
+    def set(self, key, value):
+        self.setMany({key: value})
+
+    def setMany(self, values):
+        now = time.time()
+        rows = [(key, zlib.compress(json.dumps(value).encode()), now)
+                for key, value in values.items()]
+        try:
+            with self._connect() as conn:
+                conn.executemany("INSERT OR REPLACE INTO cache VALUES (?, ?, ?)", rows)
+                before = self._sets
+                self._sets += len(rows)
+                if before // 1000 != self._sets // 1000:
+                    conn.execute("DELETE FROM cache WHERE key IN (SELECT key FROM cache "
+                                 "ORDER BY stored DESC LIMIT -1 OFFSET ?)", (self._maxEntries,))
+        except sqlite3.Error as e:
+            print("SharedCache: failed to store", list(values)[:3], e)
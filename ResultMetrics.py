@@ -0,0 +1,237 @@
+# Python 3
+#
+# Timing spans and counters of the result presenter
+#
+# Spans record their duration in a latency histogram and, while a request is
+# served, in the span breakdown of the request. All metrics are exported in
+# the Prometheus text format by the /metrics route. They are kept per server
+# process, with several workers each one reports its own.
+
+import re
+import time
+import threading
+import functools
+import collections
+
+# upper bounds of the latency histograms in seconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+HELP = {
+    "autopar_span_seconds": ("histogram", "Duration of instrumented functions"),
+    "autopar_request_seconds": ("histogram", "Duration of HTTP requests"),
+    "autopar_cache_requests_total": ("counter", "Cache lookups by cache and result"),
+    "autopar_bytes_read_total": ("counter", "Bytes of result files read or decoded"),
+}
+
+
+class Registry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = collections.defaultdict(float)
+        # (name, labels): [count of each bucket, sum, count]
+        self._histograms = {}
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] += value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = [[0] * len(LATENCY_BUCKETS), 0.0, 0]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    hist[0][i] += 1
+            hist[1] += value
+            hist[2] += 1
+
+    @staticmethod
+    def _formatLabels(labels, extra=()):
+        labels = list(labels) + list(extra)
+        if not labels:
+            return ""
+        values = ['%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"'))
+                  for k, v in labels]
+        return "{" + ",".join(values) + "}"
+
+    # all metrics in the Prometheus text exposition format
+    def render(self):
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((key, [list(hist[0]), hist[1], hist[2]])
+                                for key, hist in self._histograms.items())
+
+        lines = []
+        described = set()
+
+        def describe(name):
+            if name not in described and name in HELP:
+                kind, text = HELP[name]
+                lines.append("# HELP %s %s" % (name, text))
+                lines.append("# TYPE %s %s" % (name, kind))
+                described.add(name)
+
+        for (name, labels), value in counters:
+            describe(name)
+            lines.append("%s%s %s" % (name, self._formatLabels(labels), repr(float(value))))
+        for (name, labels), (buckets, total, count) in histograms:
+            describe(name)
+            for bound, bucket in zip(LATENCY_BUCKETS, buckets):
+                lines.append("%s_bucket%s %d" % (name, self._formatLabels(labels, [("le", bound)]),
+                                                 bucket))
+            lines.append("%s_bucket%s %d" % (name, self._formatLabels(labels, [("le", "+Inf")]),
+                                             count))
+            lines.append("%s_sum%s %s" % (name, self._formatLabels(labels), repr(total)))
+            lines.append("%s_count%s %d" % (name, self._formatLabels(labels), count))
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# {span: [total seconds, calls]} of the request served by this thread
+_request = threading.local()
+
+
+def inc(name, value=1, **labels):
+    REGISTRY.inc(name, value, **labels)
+
+
+def countCache(cache, result):
+    REGISTRY.inc("autopar_cache_requests_total", cache=cache, result=result)
+
+
+def countBytes(source, size):
+    REGISTRY.inc("autopar_bytes_read_total", size, source=source)
+
+
+def recordSpan(name, seconds):
+    REGISTRY.observe("autopar_span_seconds", seconds, span=name)
+    spans = getattr(_request, "spans", None)
+    if spans is not None:
+        entry = spans.setdefault(name, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+
+# Spans may nest, the breakdown of a request then counts the time of the
+# inner span in both
+class span:
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        recordSpan(self.name, time.perf_counter() - self.start)
+        return False
+
+
+# decorator timing each call of a function in a span
+def timed(name):
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        wrapper._timedSpan = name
+        return wrapper
+    return decorate
+
+
+# time every public method of cls in a span named <cls>.<method>
+def instrumentMethods(cls):
+    for attr, value in list(vars(cls).items()):
+        if attr.startswith("_") or not callable(value) or hasattr(value, "_timedSpan"):
+            continue
+        setattr(cls, attr, timed("%s.%s" % (cls.__name__, attr))(value))
+    return cls
+
+
+# time every server-side callback of a Dash app in a span named after the
+# callback function, callbacks already instrumented are left alone
+def instrumentCallbacks(app):
+    for callback in app.callback_map.values():
+        fn = callback.get("callback")
+        if fn is not None and not hasattr(fn, "_timedSpan"):
+            callback["callback"] = timed("callback:" + fn.__name__)(fn)
+
+
+def beginRequest():
+    _request.spans = {}
+    _request.start = time.perf_counter()
+
+
+# total seconds and {span: [total seconds, calls]} of the request
+def endRequest():
+    spans = getattr(_request, "spans", None)
+    if spans is None:
+        return None, {}
+    _request.spans = None
+    return time.perf_counter() - _request.start, spans
+
+
+_TOKEN = re.compile(r"[^A-Za-z0-9!#$%&'*+.^_`|~-]")
+
+
+# Server-Timing header value of a span breakdown, slowest span first
+def formatServerTiming(total, spans):
+    items = ["total;dur=%.2f" % (total * 1000)]
+    for name, (seconds, calls) in sorted(spans.items(), key=lambda x: x[1][0], reverse=True):
+        items.append('%s;dur=%.2f;desc="%d calls"' % (_TOKEN.sub("_", name), seconds * 1000, calls))
+    return ", ".join(items)
+
+
+# label of the route of a Flask request, Dash callbacks are told apart by
+# their output
+def getRoute(request):
+    route = request.url_rule.rule if request.url_rule else "other"
+    if route == "/_dash-update-component":
+        body = request.get_json(silent=True) or {}
+        route += ":" + str(body.get("output", ""))
+    return route
+
+
+# Time the requests of a Flask server and add the /metrics route. The span
+# breakdown of a request is returned in a Server-Timing header and logged
+# when the request has an X-Debug-Spans header, or for every request if
+# logSpans is set.
+def installServer(server, logSpans=False):
+    import flask
+
+    if "autopar_metrics" in server.view_functions:
+        return
+
+    @server.before_request
+    def startTiming():
+        beginRequest()
+
+    @server.after_request
+    def stopTiming(response):
+        total, spans = endRequest()
+        if total is None:
+            return response
+
+        route = getRoute(flask.request)
+        REGISTRY.observe("autopar_request_seconds", total, route=route)
+
+        if logSpans or flask.request.headers.get("X-Debug-Spans"):
+            timing = formatServerTiming(total, spans)
+            response.headers["Server-Timing"] = timing
+            print("request %s %.1fms: %s" % (route, total * 1000, timing))
+        return response
+
+    def metrics():
+        return flask.Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+    server.add_url_rule("/metrics", "autopar_metrics", metrics)
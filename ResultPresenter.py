@@ -8,27 +8,369 @@
 
 import argparse
 import os
+import sys
+import tempfile
 import json
+import time
+import hashlib
+import inspect
+import threading
+import collections
+import functools
+import types
+import concurrent.futures
 import numpy as np
 import dash
-from dash import dcc, html
+from dash import dcc, html, dash_table
+import plotly.utils
 import plotly.graph_objects as go
-from VisualizeCoverage import getCdfFig
-from pygments import highlight
-from pygments.lexers.asm import LlvmLexer
-from pygments.formatters import HtmlFormatter
+from VisualizeCoverage import computeCdfs, renderCdfFig
+from ResultCache import DocumentStore, StatusIndex, RunCatalog, MemoStore, FigureCache, IRHighlighter, \
+    OffsetIndexStore, SharedCache
+from ResultTable import RunTable, TableStore
+import JsonStream
+import ResultMetrics
+import ResultProfiler
+import SpeedupStats
+import ResponseEncoding
 import dash_dangerously_set_inner_html
 
-# Geometric mean helper
-def geo_mean_overflow(iterable):
-    a = np.log(iterable)
-    return np.exp(a.sum() / len(a))
+
+# columns of the SLAMP loop table of the status page
+LOOP_TABLE_KEYS = ["debug_info", "exec_coverage", "loop_stage", "loop_speedup", "slamp", "covered_lcDeps", "total_lcDeps", "lcDeps_coverage"]
+LOOP_TABLE_NAMES = ["Benchmark", "Loop", "Debug Info", "Exec Coverage (%)", "Loop Stage", "Loop Speedup (x)", "SLAMP", "Covered LC Deps", "Total LC Deps", "LC Deps Coverage (%)"]
+LOOP_TABLE_PAGE_SIZE = 50
+# runs whose loop table rows are kept in memory, least recently used first out
+LOOP_ROWS_RUNS = 32
+# blocking dependencies rendered per page of one type
+DEP_PAGE_SIZE = 50
+# bump when the data behind the cached pages changes to invalidate the
+# figure cache, changes to the code of a page are picked up by getCodeKey
+FIGURE_CACHE_VERSION = 1
+
+
+# Fingerprint of the code of a page builder and of the functions of its
+# module it calls, so that editing a page, e.g. its hard-coded runs,
+# invalidates its cached layout
+@functools.lru_cache(maxsize=None)
+def getCodeKey(fn):
+    fn = inspect.unwrap(fn)
+    h = hashlib.sha1()
+    seen = set()
+
+    def addCode(code):
+        h.update(code.co_code)
+        h.update(repr(code.co_names).encode())
+        for const in code.co_consts:
+            if isinstance(const, types.CodeType):
+                addCode(const)
+            elif isinstance(const, frozenset):
+                # the order of a set changes with the string hash seed
+                h.update(repr(sorted(const, key=repr)).encode())
+            else:
+                h.update(repr(const).encode())
+        for name in code.co_names:
+            obj = fn.__globals__.get(name)
+            if (isinstance(obj, types.FunctionType) and obj.__module__ == fn.__module__
+                    and name not in seen):
+                seen.add(name)
+                addCode(inspect.unwrap(obj).__code__)
+
+    addCode(fn.__code__)
+    return h.hexdigest()
 
 
 class ResultProvider:
 
-    def __init__(self, path):
+    # status files larger than streamBytes are read incrementally instead
+    # of being parsed whole, sharedCache keeps derived results for all
+    # server processes. Up to loadWorkers runs are loaded at once, the
+    # benchmarks of a coverage directory are solved by cdfWorkers processes.
+    def __init__(self, path, cacheBytes=512 * 1024 * 1024, streamBytes=64 * 1024 * 1024,
+                 sharedCache=None, loadWorkers=8, cdfWorkers=1):
         self._path = path
+        self._streamBytes = streamBytes
+        self._shared = sharedCache
+        self._docs = DocumentStore(cacheBytes)
+        self._statusIndex = StatusIndex()
+        self._tables = TableStore(self._statusIndex)
+        self._memos = MemoStore(path)
+        # keep the memos of all runs up to date in the background
+        self._catalog = RunCatalog(path, onPoll=self._memos.revalidate)
+        self._figures = FigureCache(os.path.join(path, ".figure_cache"))
+        # runs read by the page currently built by getCachedLayout
+        self._recorder = threading.local()
+        # offset indexes of the run buildStatusCaches builds in this thread
+        self._building = threading.local()
+        self._loopRows = collections.OrderedDict()
+        self._highlighter = IRHighlighter(shared=sharedCache)
+        self._offsets = OffsetIndexStore()
+        self._lock = threading.Lock()
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=max(1, loadWorkers),
+                                                           thread_name_prefix="run-loader")
+        self._cdfWorkers = cdfWorkers
+
+    def _record(self, date):
+        runs = getattr(self._recorder, "runs", None)
+        if runs is not None and date not in runs:
+            runs.append(date)
+
+    # fingerprint of the status files and memo file of each run, and of the
+    # encoding of the figures
+    def getRunsKey(self, date_list):
+        h = hashlib.sha1(("%d:%s;" % (FIGURE_CACHE_VERSION, ResponseEncoding.getSettingsKey())).encode())
+        for date in date_list:
+            date_path = os.path.join(self._path, date)
+            try:
+                status_files = self._statusIndex.listStatusFiles(date_path)
+                key = self._tables.getKey(date_path, status_files)
+            except OSError:
+                key = "missing"
+            h.update(("%s:%s:%s;" % (date, key, self._memos.getMemoStamp(date))).encode())
+        return h.hexdigest()
+
+    # Serialized layout returned by build(resultProvider), cached until one
+    # of the runs it read or the code of build changes
+    def getCachedLayout(self, page, build):
+        codeKey = getCodeKey(build)
+
+        def getKey(date_list):
+            return codeKey + ":" + self.getRunsKey(date_list)
+
+        def recordBuild():
+            self._recorder.runs = []
+            try:
+                layout = build(self)
+                runs = self._recorder.runs
+            finally:
+                self._recorder.runs = None
+            with ResultMetrics.span("serialize:" + page):
+                layout = json.loads(json.dumps(layout, cls=plotly.utils.PlotlyJSONEncoder))
+            return layout, runs
+
+        return self._figures.get(page, getKey, recordBuild)
+
+    # sorted names of the runs that have a status.json
+    def getRuns(self):
+        return self._catalog.getRuns()
+
+    def getMemo(self, date):
+        self._record(date)
+        return self._memos.getMemo(date)
+
+    def getMemos(self, date_list):
+        for date in date_list:
+            self._record(date)
+        return self._memos.getMemos(date_list)
+
+    # keep the run catalogue up to date in the background
+    def startIndexer(self):
+        self._catalog.start()
+
+    # parsed status.json of a run, shared by all pages and callbacks
+    def loadStatus(self, date, filename="status.json"):
+        self._record(date)
+        return self._docs.load(os.path.join(self._path, date, filename))
+
+    def _statusPath(self, date):
+        return os.path.join(self._path, date, "status.json")
+
+    # byte offsets of the benchmarks, experiments and loops of status.json
+    # if it is too large to be parsed whole, None otherwise
+    def _getOffsets(self, date):
+        path = self._statusPath(date)
+        if os.path.getsize(path) <= self._streamBytes:
+            return None
+        self._record(date)
+        building = getattr(self._building, "offsets", None)
+        if building is None:
+            return self._offsets.get(path)
+        if path not in building:
+            building[path] = self._offsets.get(path, keep=False)
+        return building[path]
+
+    # benchmarks of status.json
+    def getBmarks(self, date):
+        offsets = self._getOffsets(date)
+        if offsets is None:
+            return list(self.loadStatus(date).keys())
+        return list(offsets)
+
+    # {bmark: {pass: whether it has results}} of status.json
+    def getPassFlags(self, date):
+        offsets = self._getOffsets(date)
+        if offsets is None:
+            return {bmark: {p: bool(value) for p, value in st.items()}
+                    for bmark, st in self.loadStatus(date).items()}
+        return {bmark: {p: exp["truthy"] for p, exp in exps.items()}
+                for bmark, exps in offsets.items()}
+
+    # {loop: {key: value}} of the given keys of the Exp-slamp loops of a
+    # benchmark, only the loop records are decoded for large files
+    def getLoopFields(self, date, bmark, keys):
+        offsets = self._getOffsets(date)
+        if offsets is None:
+            status = self.loadStatus(date)
+            if bmark not in status or not status[bmark].get('Exp-slamp'):
+                return {}
+            st = status[bmark]['Exp-slamp']['loops'] or {}
+            return {loop: {key: st[loop][key] for key in keys if key in st[loop]}
+                    for loop in st}
+
+        exp = offsets.get(bmark, {}).get('Exp-slamp')
+        if exp is None or not exp["truthy"]:
+            return {}
+        with JsonStream.openJson(self._statusPath(date)) as buf:
+            return {loop: JsonStream.loadFields(buf, start, keys)
+                    for loop, (start, _) in exp["loops"].items()}
+
+    # {loop: exec_coverage} of the Exp-slamp loops of a benchmark
+    def getLoopCoverages(self, date, bmark):
+        loops = self.getLoopFields(date, bmark, ['exec_coverage'])
+        return {loop: fields['exec_coverage'] for loop, fields in loops.items()
+                if 'exec_coverage' in fields}
+
+    # Summary of a run for the status page dropdowns: the sorted
+    # benchmarks, the loops of each benchmark sorted by exec_coverage and
+    # the pass flags
+    def getRunSummary(self, date):
+        key = self._getSharedKey("summary", date)
+        summary = self._shared.get(key) if key else None
+        if summary is not None:
+            return summary
+
+        bmarks = list(sorted(self.getBmarks(date)))
+        loops = {}
+        for bmark in bmarks:
+            st = self.getLoopCoverages(date, bmark)
+            loops[bmark] = list(sorted(st, key=lambda x: st[x], reverse=True))
+        summary = {"bmarks": bmarks, "loops": loops, "passes": self.getPassFlags(date)}
+
+        if key:
+            self._shared.set(key, summary)
+        return summary
+
+    # key of a result derived from status.json in the shared cache, None
+    # without a shared cache
+    def _getSharedKey(self, kind, date):
+        if self._shared is None:
+            return None
+        st = os.stat(self._statusPath(date))
+        return "%s:%s:%d:%d" % (kind, self._statusPath(date), st.st_size, st.st_mtime_ns)
+
+    # Rows of the SLAMP loop table of the status page, one per loop of
+    # Exp-slamp, and the row indexes of each benchmark. Rebuilt when the
+    # status.json of the run changes.
+    def getLoopRows(self, date):
+        self._record(date)
+        st = os.stat(self._statusPath(date))
+        stamp = (st.st_size, st.st_mtime_ns)
+        with self._lock:
+            entry = self._loopRows.get(date)
+            if entry is not None and entry[0] == stamp:
+                self._loopRows.move_to_end(date)
+                return entry[1], entry[2]
+
+        # the shared cache is checked before status.json is read
+        key = self._getSharedKey("loopRows", date)
+        shared = self._shared.get(key) if key else None
+        if shared is not None:
+            rows, bmark_rows = shared
+            self._keepLoopRows(date, (stamp, rows, bmark_rows))
+            return rows, bmark_rows
+
+        offsets = self._getOffsets(date)
+        source = self.loadStatus(date) if offsets is None else offsets
+        rows = []
+        bmark_rows = {}
+        for bmark in sorted(source):
+            loops = self.getLoopFields(date, bmark, LOOP_TABLE_KEYS)
+            if not loops:
+                continue
+            bmark_rows[bmark] = []
+            for loop, values in loops.items():
+                row = {"bmark": bmark, "loop": loop}
+                for column in LOOP_TABLE_KEYS:
+                    value = values.get(column, "-")
+                    if not isinstance(value, (int, float, str)):
+                        value = str(value)
+                    row[column] = value
+                bmark_rows[bmark].append(len(rows))
+                rows.append(row)
+
+        self._keepLoopRows(date, (stamp, rows, bmark_rows))
+        if key:
+            self._shared.set(key, [rows, bmark_rows])
+        return rows, bmark_rows
+
+    def _keepLoopRows(self, date, entry):
+        if getattr(self._building, "offsets", None) is not None:
+            return
+        with self._lock:
+            self._loopRows[date] = entry
+            self._loopRows.move_to_end(date)
+            while len(self._loopRows) > LOOP_ROWS_RUNS:
+                self._loopRows.popitem(last=False)
+
+    # Write the offset index sidecar and the shared cache entries of the
+    # status page of a run without keeping them in memory, for prewarm
+    def buildStatusCaches(self, date):
+        self._building.offsets = {}
+        try:
+            self.getRunSummary(date)
+            self.getLoopRows(date)
+        finally:
+            self._building.offsets = None
+
+    # blocking_deps of a loop of Exp-slamp grouped by type, sorted by type
+    def getDepGroups(self, date, bmark, loop):
+        offsets = self._getOffsets(date)
+        if offsets is None:
+            status = self.loadStatus(date)
+            blocking_deps = status[bmark]["Exp-slamp"]["loops"][loop]["blocking_deps"]
+        else:
+            start, _ = offsets[bmark]["Exp-slamp"]["loops"][loop]
+            with JsonStream.openJson(self._statusPath(date)) as buf:
+                blocking_deps = JsonStream.loadFields(buf, start, ["blocking_deps"])["blocking_deps"]
+        dep_groups = {}
+        for dep in sorted(blocking_deps, key=lambda x: x["type"]):
+            dep_groups.setdefault(dep["type"], []).append(dep)
+        return dep_groups
+
+    # highlighted html of the src and dst of all dependencies, each unique
+    # instruction is only highlighted once
+    def highlightDeps(self, deps):
+        snippets = [dep["src"] for dep in deps] + [dep["dst"] for dep in deps]
+        return self._highlighter.highlightAll(snippets)
+
+    # columnar tables of all status files of a run
+    def getRunTable(self, date):
+        self._record(date)
+        return self._tables.get(os.path.join(self._path, date))
+
+    # write the table of a run to disk without loading it, for prewarm
+    def buildRunTable(self, date):
+        self._tables.build(os.path.join(self._path, date))
+
+    # tables of several runs loaded in the pool, in the order of date_list
+    def getRunTables(self, date_list):
+        for date in date_list:
+            self._record(date)
+        paths = [os.path.join(self._path, date) for date in date_list]
+        if len(paths) < 2:
+            return [self._tables.get(path) for path in paths]
+        return list(self._pool.map(self._tables.get, paths))
+
+    # threshold-coverage CDFs of a run, see VisualizeCoverage.computeCdfs
+    def computeCdfs(self, date, progress=None):
+        return computeCdfs(os.path.join(self._path, date), workers=self._cdfWorkers,
+                           progress=progress)
+
+    # {bmark: (column values, ...)} of the rows in mask
+    @staticmethod
+    def _byBmark(table, mask, *columns):
+        values = [table[col][mask].tolist() for col in columns]
+        return dict(zip(table['bmark'][mask].tolist(), zip(*values)))
 
     def getPriorResults(self, bmark_list):
         prior_file = "prior_results.json"
@@ -51,39 +393,32 @@ class ResultProvider:
     def getSequentialData(self, bmark_list, date_list):
         # Newer result overwrite old result
         result_dict = {}
-        for date in date_list:
-            status_path = os.path.join(self._path, date, "status.json")
-            with open(status_path, "r") as fd:
-                status = json.load(fd)
+        for table in self.getRunTables(date_list):
+            runs = table.runs
+            mask = RunTable.select(runs, experiment="RealSpeedup", per_bmark=False,
+                                   bmark=bmark_list)
+            mask &= ~np.isnan(runs['seq_time'])
+            found = self._byBmark(runs, mask, 'seq_time')
 
             for bmark in bmark_list:
-                if bmark in status and "RealSpeedup" in status[bmark]:
-                    real_speedup = status[bmark]["RealSpeedup"]
-                    if not real_speedup:
-                        continue
-
-                    if "seq_time" not in real_speedup:
-                        continue
-
-                    result_dict[bmark] = real_speedup["seq_time"]
+                if bmark in found:
+                    result_dict[bmark] = found[bmark][0]
 
         return result_dict
 
     def getParallelData(self, bmark_list, date_list):
 
         para_time_dict = {}
-        for date in date_list:
-            status_path = os.path.join(self._path, date, "status.json")
-            with open(status_path, "r") as fd:
-                status = json.load(fd)
+        for table in self.getRunTables(date_list):
+            runs = table.runs
+            mask = RunTable.select(runs, experiment="RealSpeedup", per_bmark=False,
+                                   bmark=bmark_list)
+            mask &= ~np.isnan(runs['para_time'])
+            found = self._byBmark(runs, mask, 'para_time')
 
             for bmark in bmark_list:
-                if bmark in status and "RealSpeedup" in status[bmark]:
-                    real_speedup = status[bmark]["RealSpeedup"]
-                    if not real_speedup or 'para_time' not in real_speedup:
-                        continue
-
-                    para_time_dict[bmark] = real_speedup['para_time']
+                if bmark in found:
+                    para_time_dict[bmark] = found[bmark][0]
 
         return para_time_dict
 
@@ -93,96 +428,73 @@ class ResultProvider:
         bar_list = [{'x': bmark_list, 'y': prior_speedup_list,
                      'text': prior_text_list, 'type': 'bar', 'name': "Best Prior Result"}]
 
-        for date in date_list:
-            status_path = os.path.join(self._path, date, "status.json")
-            with open(status_path, "r") as fd:
-                status = json.load(fd)
+        for date, table in zip(date_list, self.getRunTables(date_list)):
+            runs = table.runs
+            mask = RunTable.select(runs, experiment="RealSpeedup", per_bmark=False,
+                                   bmark=bmark_list)
+            found = self._byBmark(runs, mask, 'speedup', 'seq_time', 'para_time')
 
             have_results_bmark_list = []
             real_speedup_list = []
             text_list = []
             for bmark in bmark_list:
-                if bmark in status and "RealSpeedup" in status[bmark]:
-                    real_speedup = status[bmark]["RealSpeedup"]
-                    if not real_speedup:
-                        continue
+                if bmark in found:
+                    speedup, seq_time, para_time = found[bmark]
                     have_results_bmark_list.append(bmark)
-                    real_speedup_list.append(real_speedup['speedup'])
+                    real_speedup_list.append(speedup)
                     text_list.append("Seq time: %s, para time: %s" % (
-                        round(real_speedup['seq_time'], 2), round(real_speedup['para_time'], 2)))
+                        round(seq_time, 2), round(para_time, 2)))
 
             bar_list.append({'x': have_results_bmark_list, 'y': real_speedup_list,
                              'text': text_list, 'type': 'bar', 'name': "Results from" + date})
         return bar_list
 
-    def updateResult(self, date_list):
-        all_reg_results = {}
-
-        for date in date_list:
-            date_path = os.path.join(self._path, date)
-            all_status = {}
-            for filename in os.listdir(date_path):
-                if filename.endswith(".json") and filename.startswith("status"):
-                    with open(os.path.join(date_path, filename), 'r') as fd:
-                        status = json.load(fd)
-                        bmark = filename.replace(
-                            "status_", "").replace(".json", "")
-                        all_status[bmark] = status
-
-            all_reg_results[date] = all_status
-        self._all_reg_results = all_reg_results
-
     def getMultiCoreData(self, bmark_list, date_list):
 
         # Newer result overwrite old result
         result_dict = {}
-        for date in date_list:
-            status_path = os.path.join(self._path, date, "status.json")
-            with open(status_path, "r") as fd:
-                status = json.load(fd)
+        for table in self.getRunTables(date_list):
+            cores = table.cores
+            # group the rows by bmark, sorted by number of cores
+            rows = np.nonzero(RunTable.select(cores, bmark=bmark_list))[0]
+            rows = rows[np.lexsort((cores['para_time'][rows], cores['cores'][rows],
+                                    cores['bmark'][rows]))]
+            bmarks, starts = np.unique(cores['bmark'][rows], return_index=True)
+
+            found = {}
+            for bmark, group in zip(bmarks.tolist(), np.split(rows, starts[1:])):
+                found[bmark] = [cores['cores'][group].tolist(),
+                                cores['para_time'][group].tolist()]
 
             for bmark in bmark_list:
-                if bmark in status and "RealSpeedup" in status[bmark]:
-                    real_speedup = status[bmark]["RealSpeedup"]
-                    if not real_speedup:
-                        continue
-
-                    if "para_time_dict" not in real_speedup:
-                        continue
-
-                    para_time_dict = real_speedup["para_time_dict"]
-                    x_list = []
-                    y_list = []
-                    for x, y in para_time_dict.items():
-                        x_list.append(int(x))
-                        y_list.append(y)
-                    x_list, y_list = (list(t)
-                                      for t in zip(*sorted(zip(x_list, y_list))))
-
-                    result_dict[bmark] = [x_list, y_list]
+                if bmark in found:
+                    result_dict[bmark] = found[bmark]
 
         return result_dict
 
     def getLoopData(self, bmark):
 
-        date_list = ['2019-06-08']
-        self.updateResult(date_list)
+        date = '2019-06-08'
+        table = self.getRunTable(date)
+        runs, loops = table.runs, table.loops
         # TODO: fake result, only 05-22
-        if bmark not in self._all_reg_results['2019-06-08']:
+        if not RunTable.select(runs, bmark=bmark, per_bmark=True).any():
             print(bmark + " not exists")
             return None
 
-        status = self._all_reg_results['2019-06-08'][bmark]
-        if 'Experiment' in status and status['Experiment']:
-            status = status['Experiment']
-            if "speedup" not in status or "loops" not in status:
-                print("NO Speedup or loops")
-                return None
-        else:
+        rows = np.nonzero(RunTable.select(runs, bmark=bmark, per_bmark=True,
+                                          experiment='Experiment'))[0]
+        if len(rows) == 0:
+            return None
+        row = rows[0]
+        if np.isnan(runs['speedup'][row]) or not runs['has_loops'][row]:
+            print("NO Speedup or loops")
             return None
 
-        speedup = status['speedup']
-        loops = status['loops']
+        speedup = float(runs['speedup'][row])
+        mask = RunTable.select(loops, bmark=bmark, per_bmark=True,
+                               experiment='Experiment', selected=1)
+        mask &= ~np.isnan(loops['loop_speedup'])
 
         the_rest = 100
         para_whole = 100 / speedup
@@ -190,21 +502,19 @@ class ResultProvider:
 
         data = []
 
-        for loop, loop_info in loops.items():
-            if 'selected' in loop_info and loop_info['selected']:
-                if 'loop_speedup' in loop_info:
-                    exec_coverage = loop_info['exec_coverage']
-                    the_rest -= exec_coverage
+        for loop, exec_coverage, loop_speedup in zip(loops['loop'][mask].tolist(),
+                                                     loops['exec_coverage'][mask].tolist(),
+                                                     loops['loop_speedup'][mask].tolist()):
+            the_rest -= exec_coverage
 
-                    loop_speedup = loop_info['loop_speedup']
-                    para_coverage = exec_coverage / loop_speedup
+            para_coverage = exec_coverage / loop_speedup
 
-                    para_the_rest -= para_coverage
-                    data.append(go.Bar(
-                        x=['Sequential', 'Parallel'],
-                        y=[exec_coverage, para_coverage],
-                        name=loop
-                    ))
+            para_the_rest -= para_coverage
+            data.append(go.Bar(
+                x=['Sequential', 'Parallel'],
+                y=[exec_coverage, para_coverage],
+                name=loop
+            ))
 
         data.append(go.Bar(
             x=['Sequential', 'Parallel'],
@@ -215,51 +525,24 @@ class ResultProvider:
         return data
 
     def getSpeedupExp3(self, date_list, speedup_threshold=2.0):
-        self.updateResult(date_list)
         speedup_bar_list = []
 
-        def getMemo(date):
-            # if exist .log file
-            log_path = self._path + date + '.log'
-            if not os.path.exists(log_path):
-                log_path = self._path + date + "/config.json"
-            if not os.path.exists(log_path):
-                return "No Log File"
-
-            with open(log_path) as fd:
-                obj = json.load(fd)
-                if 'memo' in obj:
-                    return obj['memo']
-                else:
-                    return "No Memo"
-
         def update_list(x_list, y_list, date, exp_key):
-            # sort two list together
-            y_list, x_list = (list(t)
-                              for t in zip(*sorted(zip(y_list, x_list))))
-
-            geomean = geo_mean_overflow(y_list)
-            x_list.append("geomean")
-            y_list.append(geomean)
+            x_list, y_list = SpeedupStats.sortWithGeomean(x_list, y_list)
             # y_list = list(map(lambda x: x - 1, y_list))
             return {'x': x_list, 'y': y_list, 'type': 'bar',
-                    'name': date[5:] + " " + exp_key[11:] + " " + getMemo(date)}
+                    'name': date[5:] + " " + exp_key[11:] + " " + self.getMemo(date)}
 
-        for date in date_list:
-            reg_results = self._all_reg_results[date]
+        for date, table in zip(date_list, self.getRunTables(date_list)):
+            runs = table.runs
             #exps = [ "Experiment-no-spec", "Experiment-cheap-spec", "Experiment-all-spec", "Experiment-no-specpriv"]
             # exps = [ "Experiment-no-spec", "Experiment-cheap-spec", "Experiment-all-spec"]
             exps = [ "Experiment-no-spec", "Experiment-no-specpriv", "Exp-slamp"]
             for exp_key in exps:
-                x_list = []
-                y_list = []
-                for bmark, status in reg_results.items():
-                    if exp_key in status and status[exp_key]:
-                        if 'speedup' in status[exp_key]:
-                            x_list.append(bmark)
-                            y_list.append(status[exp_key]['speedup'])
-                            if status[exp_key]['speedup'] < speedup_threshold:
-                                continue
+                mask = RunTable.select(runs, per_bmark=True, experiment=exp_key)
+                mask &= ~np.isnan(runs['speedup'])
+                x_list = runs['bmark'][mask].tolist()
+                y_list = runs['speedup'][mask].tolist()
                 if len(x_list) > 0:
                     speedup_bar_list.append(update_list(x_list, y_list, date, exp_key))
 
@@ -267,53 +550,41 @@ class ResultProvider:
         return speedup_bar_list
 
     def getSpeedupData(self, date_list, speedup_threshold=2.0):
-        self.updateResult(date_list)
         speedup_bar_list = []
         speedup_bar_list_DOALL_only = []
         speedup_bar_list_without_DOALL = []
 
         def update_list(x_list, y_list, date):
-            # sort two list together
-            y_list, x_list = (list(t)
-                              for t in zip(*sorted(zip(y_list, x_list))))
-
-            geomean = geo_mean_overflow(y_list)
-            x_list.append("geomean")
-            y_list.append(geomean)
+            x_list, y_list = SpeedupStats.sortWithGeomean(x_list, y_list)
             # y_list = list(map(lambda x: x - 1, y_list))
             return {'x': x_list, 'y': y_list, 'type': 'bar',
                     'name': 'speedup for' + date}
 
-        for date, reg_results in self._all_reg_results.items():
-            x_list = []
-            y_list = []
+        for date, table in zip(date_list, self.getRunTables(date_list)):
+            runs, loops = table.runs, table.loops
+            mask = RunTable.select(runs, per_bmark=True, experiment='Experiment')
+            mask &= ~np.isnan(runs['speedup'])
+            x_list = runs['bmark'][mask].tolist()
+            y_list = runs['speedup'][mask].tolist()
+
+            # benchmarks with a selected loop that is not DOALL only (P22)
+            not_DOALL = RunTable.select(loops, per_bmark=True, experiment='Experiment')
+            not_DOALL &= (loops['selected'] != 0) & loops['has_stage']
+            not_DOALL &= np.char.find(loops['loop_stage'], "P22") < 0
+            not_DOALL_bmarks = set(loops['bmark'][not_DOALL].tolist())
+
+            mask &= runs['has_loops'] & (runs['speedup'] >= speedup_threshold)
             x_list_DOALL = []
             y_list_DOALL = []
             x_list_no_DOALL = []
             y_list_no_DOALL = []
-            for bmark, status in reg_results.items():
-                if 'Experiment' in status and status['Experiment']:
-                    if 'speedup' in status['Experiment']:
-                        x_list.append(bmark)
-                        y_list.append(status['Experiment']['speedup'])
-                        if status['Experiment']['speedup'] < speedup_threshold:
-                            continue
-                        if 'loops' in status['Experiment']:
-                            DOALL_only = True
-                            for name, loop_status in status['Experiment']['loops'].items():
-                                if 'selected' in loop_status and not loop_status['selected']:
-                                    continue
-                                if 'loop_stage' in loop_status and "P22" not in loop_status['loop_stage']:
-                                    DOALL_only = False
-                                    break
-                            if DOALL_only:
-                                x_list_DOALL.append(bmark)
-                                y_list_DOALL.append(
-                                    status['Experiment']['speedup'])
-                            else:
-                                x_list_no_DOALL.append(bmark)
-                                y_list_no_DOALL.append(
-                                    status['Experiment']['speedup'])
+            for bmark, speedup in zip(runs['bmark'][mask].tolist(), runs['speedup'][mask].tolist()):
+                if bmark in not_DOALL_bmarks:
+                    x_list_no_DOALL.append(bmark)
+                    y_list_no_DOALL.append(speedup)
+                else:
+                    x_list_DOALL.append(bmark)
+                    y_list_DOALL.append(speedup)
 
             speedup_bar_list.append(update_list(x_list, y_list, date))
             speedup_bar_list_DOALL_only.append(update_list(x_list_DOALL,
@@ -332,13 +603,56 @@ class ResultProvider:
             loop_names.append(loop_name)
 
 
+# every public method is timed in a span, see ResultMetrics
+ResultMetrics.instrumentMethods(ResultProvider)
+
+
 def parseArgs():
     parser = argparse.ArgumentParser()
     parser.add_argument("-p", "--root_path", type=str, required=True,
                         help="Root path of CPF benchmark directory")
+    parser.add_argument("--cache_mb", type=int, default=512,
+                        help="Memory cap of parsed status files in MB, estimated as "
+                             "3 times their file size")
+    parser.add_argument("--stream_mb", type=int, default=64,
+                        help="Read status files larger than this (in MB) incrementally")
+    parser.add_argument("--no_indexer", action="store_true",
+                        help="Scan the results directory on each page load instead of in the background")
+    parser.add_argument("--port", type=int, default=8050,
+                        help="Port to serve on")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="Number of server processes, more than one requires gunicorn")
+    parser.add_argument("--cache_dir", type=str, default=None,
+                        help="Local directory of the cache shared by the server processes")
+    parser.add_argument("--load_workers", type=int, default=8,
+                        help="Number of runs loaded at once")
+    parser.add_argument("--cdf_workers", type=int, default=1,
+                        help="Number of processes solving the coverage of the benchmarks of a run")
+    parser.add_argument("--prewarm", action="store_true",
+                        help="Build all indexes and caches before serving")
+    parser.add_argument("--build_cache", action="store_true",
+                        help="Build all indexes and caches and exit without serving")
+    parser.add_argument("--log_spans", action="store_true",
+                        help="Log the span breakdown of every request, otherwise only of "
+                             "requests with an X-Debug-Spans header")
+    parser.add_argument("--profile", choices=ResultProfiler.PROFILE_MODES, default=None,
+                        help="Profile every request with cProfile or the sampling profiler, "
+                             "the slowest are listed on /profiles")
+    parser.add_argument("--profile_dir", type=str, default=None,
+                        help="Directory of the profiles, under the cache directory by default")
+    parser.add_argument("--profile_min_ms", type=float, default=10,
+                        help="Only keep the profiles of requests slower than this")
+    parser.add_argument("--precision", type=int, default=4,
+                        help="Decimals the values of the figures are rounded to, "
+                             "negative to keep them as they are")
+    parser.add_argument("--typed_arrays", choices=["auto", "on", "off"], default="auto",
+                        help="Send the values of the figures as base64 typed arrays, "
+                             "auto if the bundled plotly.js supports them")
+    parser.add_argument("--no_compress", action="store_true",
+                        help="Do not compress the responses")
     args = parser.parse_args()
 
-    return args.root_path
+    return args
 
 
 # some setting for plot
@@ -363,12 +677,12 @@ def getRealSpeedupLayout(resultProvider):
 
               dcc.Graph(
         id='real-speed-graph',
-        figure={
+        figure=ResponseEncoding.compactFigure({
             'data': data_real_speedup,
             'layout': {
                 'title': 'Real Speedup'
             }
-        }
+        })
     )]
 
     return layout
@@ -377,7 +691,8 @@ def getRealSpeedupLayout(resultProvider):
 def getComparePrivateerLayout(resultProvider):
     bmark_list = ["correlation", "2mm", "3mm", "covariance", "gemm", "doitgen", "swaptions",
                   "blackscholes", "052.alvinn", "enc-md5", "dijkstra-dynsize", "179.art"]
-    spec_list = ["blackscholes", "052.alvinn", "enc-md5", "dijkstra-dynsize", "179.art"]
+    # benchmarks of the commented out Spec Geomean bars
+    # spec_list = ["blackscholes", "052.alvinn", "enc-md5", "dijkstra-dynsize", "179.art"]
     perspective_time_list = ["2019-08-05-18-54"]
     privateer_peep_time_list = ["2019-08-06-15-03"]
     privateer_both_time_list = ["2019-08-07-00-38"]
@@ -390,37 +705,25 @@ def getComparePrivateerLayout(resultProvider):
     def getOneBar(time_list, bar_name, color):
         one_para_data = resultProvider.getParallelData(bmark_list, time_list)
 
-        one_bmark_list = []
-        one_speedup_list = []
-        one_text_list = []
-        one_spec_speedup_list = []
-        one_nonspec_speedup_list = []
-        for bmark, para_time in one_para_data.items():
-            if bmark not in seq_data:
-                continue
-            if bmark == "dijkstra-dynsize":
-                one_bmark_list.append("dijkstra")
-            else:
-                one_bmark_list.append(bmark)
-            seq_time = seq_data[bmark]
-            speedup = round(seq_time / para_time, 2)
-            one_speedup_list.append(speedup)
-            if bmark in spec_list:
-                one_spec_speedup_list.append(speedup)
-            else:
-                one_nonspec_speedup_list.append(speedup)
-            one_text_list.append("Seq time: %s, para time: %s" %
-                                  (round(seq_time, 2),
-                                   round(para_time, 2)))
-        one_speedup_list.append(geo_mean_overflow(one_speedup_list))
+        bmarks = [bmark for bmark in one_para_data if bmark in seq_data]
+        seq_times = np.array([seq_data[bmark] for bmark in bmarks], dtype=np.float64)
+        para_times = np.array([one_para_data[bmark] for bmark in bmarks], dtype=np.float64)
+        speedups = np.round(SpeedupStats.speedups(seq_times, para_times), 2)
+
+        one_bmark_list = ["dijkstra" if bmark == "dijkstra-dynsize" else bmark for bmark in bmarks]
+        one_speedup_list = speedups.tolist()
+        one_text_list = ["Seq time: %s, para time: %s" % (round(seq_time, 2), round(para_time, 2))
+                         for seq_time, para_time in zip(seq_times.tolist(), para_times.tolist())]
+        one_speedup_list.append(SpeedupStats.geomean(speedups))
         one_bmark_list.append("Geomean")
         one_text_list.append("Geomean")
 
-        # one_speedup_list.append(geo_mean_overflow(one_spec_speedup_list))
+        # spec_mask = np.isin(bmarks, spec_list)
+        # one_speedup_list.append(SpeedupStats.geomean(speedups[spec_mask]))
         # one_bmark_list.append("Spec Geomean")
         # one_text_list.append("Spec Geomean")
 
-        # one_speedup_list.append(geo_mean_overflow(one_nonspec_speedup_list))
+        # one_speedup_list.append(SpeedupStats.geomean(speedups[~spec_mask]))
         # one_bmark_list.append("Nonspec Geomean")
         # one_text_list.append("Nonspec Geomean")
 
@@ -429,21 +732,11 @@ def getComparePrivateerLayout(resultProvider):
         return bar_one
 
     def getOneBarSpeedup(speedup_dict, bar_name, color):
-        one_bmark_list = []
-        one_speedup_list = []
-
-        for bmark in bmark_list:
-            if bmark == "dijkstra-dynsize":
-                one_bmark_list.append("dijkstra")
-            else:
-                one_bmark_list.append(bmark)
-            one_speedup_list.append(speedup_dict[bmark])
-
-        one_text_list = one_speedup_list
-
-        one_speedup_list.append(geo_mean_overflow(one_speedup_list))
+        speedups = [speedup_dict[bmark] for bmark in bmark_list]
+        one_bmark_list = ["dijkstra" if bmark == "dijkstra-dynsize" else bmark for bmark in bmark_list]
+        one_speedup_list = speedups + [SpeedupStats.geomean(speedups)]
+        one_text_list = speedups + ["Geomean"]
         one_bmark_list.append("Geomean")
-        one_text_list.append("Geomean")
         bar_one = {'x': one_bmark_list, 'y': one_speedup_list, 'text': one_text_list,
                    'type': 'bar', 'name': bar_name, 'marker_color': color}
         return bar_one
@@ -535,7 +828,7 @@ def getComparePrivateerLayout(resultProvider):
 
               dcc.Graph(
         id='privateer-compare-graph',
-        figure=fig
+        figure=ResponseEncoding.compactFigure(fig)
     )]
 
     return layout
@@ -590,7 +883,7 @@ def getEstimatedSpeedupLayoutExp3(resultProvider):
 
         dcc.Graph(
             id='speed-graph',
-            figure=fig
+            figure=ResponseEncoding.compactFigure(fig)
             )]
 
     return layout_speedup
@@ -623,12 +916,12 @@ def getEstimatedSpeedupLayout(resultProvider):
 
                       dcc.Graph(
         id='speed-graph',
-        figure={
+        figure=ResponseEncoding.compactFigure({
             'data': data_speedup,
             'layout': {
                 'title': 'Speedup'
             }
-        }
+        })
     )]
 
     layout_speedup_DOALL = [html.Div(children='''
@@ -636,12 +929,12 @@ def getEstimatedSpeedupLayout(resultProvider):
         '''),
                             dcc.Graph(
         id='speed-graph-DOALL',
-        figure={
+        figure=ResponseEncoding.compactFigure({
             'data': data_speedup_DOALL,
             'layout': {
                 'title': 'Speedup DOALL Only'
             }
-        }
+        })
     )]
 
     layout_speedup_no_DOALL = [html.Div(children='''
@@ -649,12 +942,12 @@ def getEstimatedSpeedupLayout(resultProvider):
         '''),
                                dcc.Graph(
         id='speed-graph-noDOALL',
-        figure={
+        figure=ResponseEncoding.compactFigure({
             'data': data_speedup_no_DOALL,
             'layout': {
                 'title': 'Speedup DSWP (excluding DOALL only)'
             }
-        }
+        })
     )]
 
     if layout_speedup:
@@ -676,13 +969,13 @@ def getOneBenchmarkLayout(resultProvider, bmark):
 
                   dcc.Graph(
             id='bmark-graph',
-            figure={
+            figure=ResponseEncoding.compactFigure({
                 'data': data_bmark,
                 'layout': {
                     'title': 'Execution Time Breakdown',
                     'barmode': 'stack'
                 }
-            }
+            })
         )]
     else:
         layout = None
@@ -714,13 +1007,16 @@ def getMultiCoreLayout(resultProvider):
     fig.update_yaxes(range=[0, 28], showgrid=True, gridwidth=1, nticks=29, title_text="Whole Program Speedup over Sequential", ticks="inside",
                      showline=True, linewidth=2, linecolor='black', gridcolor='rgb(200,200,200)', mirror='all', ticksuffix="x", layer="below traces")
  
-    for bmark in bmark_list:
-        if bmark not in multicore_data:
-            continue
-        result =  multicore_data[bmark]
-        x_list, y_list = result
-        seq_time = seq_data[bmark]
-        speedup_list = [seq_time / x for x in y_list]
+    # speedups of all benchmarks over all core counts at once, a row per
+    # benchmark padded to the most core counts
+    bmarks = [bmark for bmark in bmark_list if bmark in multicore_data]
+    seq_times = np.array([seq_data.get(bmark, np.nan) for bmark in bmarks], dtype=np.float64)
+    para_times = SpeedupStats.padRows([multicore_data[bmark][1] for bmark in bmarks])
+    speedup_rows = SpeedupStats.speedups(seq_times[:, None], para_times)
+
+    for bmark, speedup_row in zip(bmarks, speedup_rows):
+        x_list = multicore_data[bmark][0]
+        speedup_list = speedup_row[:len(x_list)].tolist()
         shape = shape_list.pop()
         color = color_list.pop()
         fig.add_trace(go.Scatter(x=x_list, y=speedup_list,
@@ -748,7 +1044,7 @@ def getMultiCoreLayout(resultProvider):
         '''),
               dcc.Graph(
         id='multicore-speedup-graph',
-        figure=fig
+        figure=ResponseEncoding.compactFigure(fig)
     )]
 
     return layout
@@ -757,37 +1053,11 @@ def getMultiCoreLayout(resultProvider):
 def getCoverageDatePickerLayout():
     dates = ["2022-01-27-16-37", "2022-02-10-16-12", "2022-02-17-20-36", "2022-03-01-17-27"]
 
-    def getLatestDir(path):
-        dates = []
-        dirs = [d for d in os.listdir(path) if os.path.isdir(os.path.join(path, d))]
-        if len(dirs) == 0:
-            return None
-        for date in sorted(dirs):
-            if os.path.isfile(os.path.join(path, date, "status.json")):
-                if date > "2022-03-01-17-27":
-                    dates.append(date)
-        return dates
-
-    dates.extend(getLatestDir(app._resultProvider._path))
-
-    def getMemo(date):
-        # if exist .log file
-        log_path = app._resultProvider._path + date + '.log'
-        if not os.path.exists(log_path):
-            log_path = app._resultProvider._path + date + "/config.json"
-        if not os.path.exists(log_path):
-            return "No Log File"
-
-        with open(log_path) as fd:
-            obj = json.load(fd)
-            if 'memo' in obj:
-                return obj['memo']
-            else:
-                return "No Memo"
+    dates.extend(date for date in app._resultProvider.getRuns() if date > "2022-03-01-17-27")
 
     options = []
-    for date in dates:
-        options.append({"label": date + ":" + getMemo(date), "value": date})
+    for date, memo in zip(dates, app._resultProvider.getMemos(dates)):
+        options.append({"label": date + ":" + memo, "value": date})
 
     layout = html.Div([
         dcc.Dropdown(
@@ -795,15 +1065,16 @@ def getCoverageDatePickerLayout():
             options=options,
             value=options[-1]['value']
             ),
+        # only shown while a background callback solves the coverage
+        html.Progress(id="coverage-progress", value="0", max="1",
+                      style={"display": "none"}),
         html.Div(id="coverage-container")
         ])
 
     return layout
 
-@app.callback(
-    dash.dependencies.Output("coverage-container", "children"),
-    [dash.dependencies.Input("coverage-date-picker", "value")])
-def getCoverageLayout(date):
+# progress, if given, is called with (solved, total) benchmarks
+def getCoverageLayout(date, progress=None):
     resultProvider = app._resultProvider
 
     def setLayout(figs):
@@ -811,10 +1082,10 @@ def getCoverageLayout(date):
             fig.update_layout(autosize=False,
                     width=1000, height=500,
                     font={'family': 'Helvetica', 'color': 'Black'})
-    directory = os.path.join(resultProvider._path, date)
-    fig, bar = getCdfFig(directory)
-    figOnlyIgnore, barOnlyIgnore = getCdfFig(directory, onlyIgnoreFn=True)
-    figOnlyNotIgnore, barOnlyNotIgnore = getCdfFig(directory, onlyNotIgnoreFn=True)
+    bmarkCdf, approxBmarks = resultProvider.computeCdfs(date, progress)
+    fig, bar = renderCdfFig(bmarkCdf, approxBmarks)
+    figOnlyIgnore, barOnlyIgnore = renderCdfFig(bmarkCdf, approxBmarks, onlyIgnoreFn=True)
+    figOnlyNotIgnore, barOnlyNotIgnore = renderCdfFig(bmarkCdf, approxBmarks, onlyNotIgnoreFn=True)
 
     setLayout([fig, bar, figOnlyIgnore, barOnlyIgnore, figOnlyNotIgnore, barOnlyNotIgnore])
     layout = [html.Div([
@@ -825,27 +1096,27 @@ def getCoverageLayout(date):
         html.P("When multiple loops meet threshold requirement, a max clique algorithm is run to select the max coverage")]),
         dcc.Graph(
             id='threshold-coverage-graph',
-            figure=fig,
+            figure=ResponseEncoding.compactFigure(fig),
             ),
         dcc.Graph(
             id='threshold-coverage-bar',
-            figure=bar,
+            figure=ResponseEncoding.compactFigure(bar),
             ),
         dcc.Graph(
             id='threshold-coverage-graph-only-not-ignore',
-            figure=figOnlyNotIgnore,
+            figure=ResponseEncoding.compactFigure(figOnlyNotIgnore),
             ),
         dcc.Graph(
             id='threshold-coverage-bar-only-not-ignore',
-            figure=barOnlyNotIgnore,
+            figure=ResponseEncoding.compactFigure(barOnlyNotIgnore),
             ),
         dcc.Graph(
             id='threshold-coverage-graph-only-ignore',
-            figure=figOnlyIgnore,
+            figure=ResponseEncoding.compactFigure(figOnlyIgnore),
             ),
         dcc.Graph(
             id='threshold-coverage-bar-only-ignore',
-            figure=barOnlyIgnore,
+            figure=ResponseEncoding.compactFigure(barOnlyIgnore),
             ),
         ]
 
@@ -853,76 +1124,83 @@ def getCoverageLayout(date):
 
     return layout
 
+
+# Background callbacks need diskcache, multiprocess and psutil
+# (pip3 install "dash[diskcache]"), None without them
+def getBackgroundManager(cache_dir):
+    try:
+        import diskcache
+        return dash.DiskcacheManager(diskcache.Cache(os.path.join(cache_dir, "jobs")))
+    except ImportError:
+        return None
+
+
+# With a background manager the coverage is solved in a job process that
+# reports progress. A job is terminated when the picked date changes before
+# it finishes or the page is left, concurrent jobs of the same run share
+# one solve through the lock of the CDF cache. Without a manager the
+# coverage is solved in the request.
+def registerCoverageCallback(manager):
+    output = dash.dependencies.Output("coverage-container", "children")
+    inputs = [dash.dependencies.Input("coverage-date-picker", "value")]
+    if str(output) in app.callback_map:
+        return
+
+    if manager is None:
+        app.callback(output, inputs)(getCoverageLayout)
+        return
+
+    def updateCoverage(set_progress, date):
+        return getCoverageLayout(date, lambda done, total: set_progress((str(done), str(total))))
+
+    app.callback(output, inputs,
+                 background=True,
+                 manager=manager,
+                 progress=[dash.dependencies.Output("coverage-progress", "value"),
+                           dash.dependencies.Output("coverage-progress", "max")],
+                 progress_default=["0", "1"],
+                 running=[(dash.dependencies.Output("coverage-progress", "style"),
+                           {"display": "block"}, {"display": "none"})],
+                 cancel=[dash.dependencies.Input("url", "pathname")])(updateCoverage)
+
+# one compact summary of the picked run, the dropdowns below are filled
+# from it in the browser
 @app.callback(
-        dash.dependencies.Output('status-bmark-picker', 'options'),
+        dash.dependencies.Output('status-summary', 'data'),
         [dash.dependencies.Input('status-date-picker', 'value')]
         )
-def update_bmark_dropdown(date):
-    path = app._resultProvider._path
-    statusJson = os.path.join(path, date, "status.json")
-    with open(statusJson, 'r') as fd:
-        status = json.load(fd)
-    bmarks = list(sorted(status.keys()))
-    return bmarks
+def update_status_summary(date):
+    return app._resultProvider.getRunSummary(date)
 
-@app.callback(
-        dash.dependencies.Output('status-loop-picker', 'options'),
-        [dash.dependencies.Input('status-date-picker', 'value'), dash.dependencies.Input('status-bmark-picker', 'value')]
+app.clientside_callback(
+        """
+        function(summary) {
+            return summary ? summary.bmarks : [];
+        }
+        """,
+        dash.dependencies.Output('status-bmark-picker', 'options'),
+        [dash.dependencies.Input('status-summary', 'data')]
         )
-def update_loop_dropdown(date, bmark):
-    loops = []
-    path = app._resultProvider._path
-    statusJson = os.path.join(path, date, "status.json")
-    with open(statusJson, 'r') as fd:
-        status = json.load(fd)
 
-    if bmark != None and bmark in status:
-        if 'Exp-slamp' in status[bmark]:
-            st = status[bmark]['Exp-slamp']['loops']
-            # get the loops that are sorted by Exec Coverage (exec_coverage)
-            loops = list(sorted(st, key=lambda x: st[x]['exec_coverage'], reverse=True))
-
-    loops.insert(0, "ALL")
-
-    return loops
+app.clientside_callback(
+        """
+        function(summary, bmark) {
+            var loops = (summary && bmark && summary.loops[bmark]) || [];
+            return ["ALL"].concat(loops);
+        }
+        """,
+        dash.dependencies.Output('status-loop-picker', 'options'),
+        [dash.dependencies.Input('status-summary', 'data'), dash.dependencies.Input('status-bmark-picker', 'value')]
+        )
 
 def getStatusLayout(resultProvider):
-    path = os.path.join(resultProvider._path)
-
-    def getLatestDir(path):
-        dates = []
-        dirs = [d for d in os.listdir(path) if os.path.isdir(os.path.join(path, d))]
-        if len(dirs) == 0:
-            return None
-        for date in sorted(dirs):
-            if os.path.isfile(os.path.join(path, date, "status.json")):
-                if date >= "2022-01-27-16-37":
-                    dates.append(date)
-        return dates
-
-    dates = getLatestDir(path)
+    dates = [date for date in resultProvider.getRuns() if date >= "2022-01-27-16-37"]
     if not dates:
         return [html.Div([html.H1("No valid status files")])]
 
-    def getMemo(date):
-        # if exist .log file
-        path = app._resultProvider._path
-        log_path = path + date + '.log'
-        if not os.path.exists(log_path):
-            log_path = path + date + "/config.json"
-        if not os.path.exists(log_path):
-            return "No Log File"
-
-        with open(log_path) as fd:
-            obj = json.load(fd)
-            if 'memo' in obj:
-                return obj['memo']
-            else:
-                return "No Memo"
-
     options = []
-    for date in dates:
-        options.append({"label": date + ":" + getMemo(date), "value": date})
+    for date, memo in zip(dates, resultProvider.getMemos(dates)):
+        options.append({"label": date + ":" + memo, "value": date})
 
     layout = html.Div([
         dcc.Dropdown(
@@ -941,21 +1219,178 @@ def getStatusLayout(resultProvider):
             options=[],
             value=None
             ),
+        dcc.Store(id="status-summary"),
         html.Div(id="status-container")
         ])
 
     return layout
 
+# the picked loop is dropped when one of the benchmarks shown does not have it
+def getPickedLoop(rows, bmark_rows, picked_bmark, picked_loop):
+    if picked_loop == None or picked_loop == "ALL":
+        return None
+
+    if picked_bmark != None:
+        bmarks = [picked_bmark] if picked_bmark in bmark_rows else []
+    else:
+        bmarks = list(bmark_rows)
+    for bmark in bmarks:
+        if all(rows[i]["loop"] != picked_loop for i in bmark_rows[bmark]):
+            return None
+    return picked_loop
+
+
+FILTER_OPERATORS = [['ge ', '>='], ['le ', '<='], ['lt ', '<'], ['gt ', '>'],
+                    ['ne ', '!='], ['eq ', '='], ['contains ']]
+
+
+# split one part of a DataTable filter query, e.g. {loop_speedup} > 2,
+# into column, operator and value
+def splitFilterPart(filter_part):
+    for operator_type in FILTER_OPERATORS:
+        for operator in operator_type:
+            if operator in filter_part:
+                name_part, value_part = filter_part.split(operator, 1)
+                name = name_part[name_part.find('{') + 1: name_part.rfind('}')]
+
+                value_part = value_part.strip()
+                v0 = value_part[0] if value_part else ''
+                if v0 and v0 == value_part[-1] and v0 in ("'", '"', '`'):
+                    value = value_part[1: -1].replace('\\' + v0, v0)
+                else:
+                    try:
+                        value = float(value_part)
+                    except ValueError:
+                        value = value_part
+
+                return name, operator_type[0].strip(), value
+
+    return None, None, None
+
+
+def matchFilter(cell, operator, value):
+    try:
+        if operator == 'contains':
+            return str(value) in str(cell)
+        if operator == 'eq':
+            return cell == value or str(cell) == str(value)
+        if operator == 'ne':
+            return cell != value and str(cell) != str(value)
+        if operator == 'lt':
+            return cell < value
+        if operator == 'le':
+            return cell <= value
+        if operator == 'gt':
+            return cell > value
+        if operator == 'ge':
+            return cell >= value
+    except TypeError:
+        # comparing a number with "-" or text
+        return False
+    return True
+
+
+# numbers sort before text such as "-"
+def sortKey(value):
+    if isinstance(value, (int, float)):
+        return (0, value, "")
+    return (1, 0, str(value))
+
+
+@app.callback(
+    [dash.dependencies.Output('status-loop-table', 'data'),
+        dash.dependencies.Output('status-loop-table', 'page_count')],
+    [dash.dependencies.Input("status-date-picker", "value"),
+        dash.dependencies.Input("status-bmark-picker", "value"),
+        dash.dependencies.Input("status-loop-picker", "value"),
+        dash.dependencies.Input('status-loop-table', 'page_current'),
+        dash.dependencies.Input('status-loop-table', 'page_size'),
+        dash.dependencies.Input('status-loop-table', 'sort_by'),
+        dash.dependencies.Input('status-loop-table', 'filter_query')])
+def update_loop_table(date, picked_bmark, picked_loop, page_current, page_size, sort_by, filter_query):
+    rows, bmark_rows = app._resultProvider.getLoopRows(date)
+    picked_loop = getPickedLoop(rows, bmark_rows, picked_bmark, picked_loop)
+
+    if picked_bmark != None:
+        selected = [rows[i] for i in bmark_rows.get(picked_bmark, [])]
+    else:
+        selected = rows
+    if picked_loop != None:
+        selected = [row for row in selected if row["loop"] == picked_loop]
+
+    for filter_part in (filter_query or '').split(' && '):
+        name, operator, value = splitFilterPart(filter_part)
+        if name is None:
+            continue
+        selected = [row for row in selected if matchFilter(row.get(name), operator, value)]
+
+    # stable sorts, applied from the least significant column
+    for sort in reversed(sort_by or []):
+        selected = sorted(selected, key=lambda row: sortKey(row.get(sort['column_id'])),
+                          reverse=sort['direction'] == 'desc')
+
+    page_size = page_size or LOOP_TABLE_PAGE_SIZE
+    page_current = page_current or 0
+    page_count = max(1, -(-len(selected) // page_size))
+    start = page_current * page_size
+    return selected[start:start + page_size], page_count
+
+
+def getDepsTable(deps):
+    tb_deps = [html.Tr([html.Th("Type"), html.Th("Src/Dst")] )]
+    highlighted = app._resultProvider.highlightDeps(deps)
+    for dep in deps:
+        src = highlighted[dep["src"]]
+        dst = highlighted[dep["dst"]]
+        src = dash_dangerously_set_inner_html.DangerouslySetInnerHTML(src)
+        dst = dash_dangerously_set_inner_html.DangerouslySetInnerHTML(dst)
+
+        if "srcId" in dep:
+            src_block = html.Tr([html.Td(dep["srcId"]), html.Td(src)])
+        else:
+            src_block = html.Tr(html.Td(src))
+
+        if "dstId" in dep:
+            dst_block = html.Tr([html.Td(dep["dstId"]), html.Td(dst)])
+        else:
+            dst_block = html.Tr(html.Td(dst))
+        # put src and dst in one column
+        src_and_dst = html.Td(html.Table([src_block, dst_block]))
+        tb_deps.append(html.Tr([html.Td(dep["type"]), src_and_dst]))
+
+    return html.Table(tb_deps)
+
+
+@app.callback(
+    dash.dependencies.Output("status-deps-container", "children"),
+    [dash.dependencies.Input("status-dep-type-picker", "value"),
+        dash.dependencies.Input("status-dep-page", "value")],
+    [dash.dependencies.State("status-date-picker", "value"),
+        dash.dependencies.State("status-bmark-picker", "value"),
+        dash.dependencies.State("status-loop-picker", "value")])
+def update_deps_table(dep_type, page, date, picked_bmark, picked_loop):
+    if dep_type == None:
+        return []
+
+    try:
+        deps = app._resultProvider.getDepGroups(date, picked_bmark, picked_loop)[dep_type]
+    except (KeyError, TypeError):
+        return [html.P("No dependencies of type " + str(dep_type))]
+
+    page_count = max(1, -(-len(deps) // DEP_PAGE_SIZE))
+    page = min(max(int(page or 1), 1), page_count)
+    start = (page - 1) * DEP_PAGE_SIZE
+    return [html.P("Page %d of %d, %d dependencies" % (page, page_count, len(deps))),
+            getDepsTable(deps[start:start + DEP_PAGE_SIZE])]
+
+
 @app.callback(
     dash.dependencies.Output("status-container", "children"),
     [dash.dependencies.Input("status-date-picker", "value"),
         dash.dependencies.Input("status-bmark-picker", "value"),
         dash.dependencies.Input("status-loop-picker", "value")])
 def getStatusTable(date, picked_bmark, picked_loop):
-    path = app._resultProvider._path
-    statusJson = os.path.join(path, date, "status.json")
-    with open(statusJson, 'r') as fd:
-        status = json.load(fd)
+    status = app._resultProvider.getPassFlags(date)
     if picked_loop == "ALL":
         picked_loop = None
 
@@ -975,30 +1410,22 @@ def getStatusTable(date, picked_bmark, picked_loop):
                     td.append(html.Td("X", style={'color': 'red'}))
         tb.append(html.Tr(td))
 
-    keys = ["debug_info", "exec_coverage", "loop_stage", "loop_speedup", "slamp", "covered_lcDeps", "total_lcDeps", "lcDeps_coverage"]
-    # for each benchmark, get "Exp-slamp", if not None, get "loops", render the json
-    names = ["Benchmark", "Loop", "Debug Info", "Exec Coverage (%)", "Loop Stage", "Loop Speedup (x)", "SLAMP", "Covered LC Deps", "Total LC Deps", "LC Deps Coverage (%)"]
-    loops_tb = [html.Tr([html.Th(c) for c in names])]
-
-    for bmark, st in sorted(status.items()):
-        if picked_bmark != None and bmark != picked_bmark:
-            continue
-        if "Exp-slamp" in st and st["Exp-slamp"]:
-            loops = st["Exp-slamp"]["loops"]
-            if loops:
-                if picked_loop != None and picked_loop not in loops:
-                    picked_loop = None
-                for loop, values in loops.items():
-                    if picked_loop != None and picked_loop != loop:
-                        continue
-                    # get all values of the dict, and render it as a table
-                    rendered_values = []
-                    for key in keys:
-                        if key in values:
-                            rendered_values.append(values[key])
-                        else:
-                            rendered_values.append("-")
-                    loops_tb.append(html.Tr([html.Td(bmark), html.Td(loop)] + [html.Td(str(v)) for v in rendered_values]))
+    rows, bmark_rows = app._resultProvider.getLoopRows(date)
+    picked_loop = getPickedLoop(rows, bmark_rows, picked_bmark, picked_loop)
+
+    # the loop rows are paged, sorted and filtered by update_loop_table
+    loops_tb = dash_table.DataTable(
+        id='status-loop-table',
+        columns=[{"name": name, "id": key}
+                 for name, key in zip(LOOP_TABLE_NAMES, ["bmark", "loop"] + LOOP_TABLE_KEYS)],
+        page_current=0,
+        page_size=LOOP_TABLE_PAGE_SIZE,
+        page_action='custom',
+        sort_action='custom',
+        sort_mode='multi',
+        sort_by=[],
+        filter_action='custom',
+        filter_query='')
 
     blocks = [html.Div([
         html.H1("Status as of " + date),
@@ -1008,45 +1435,35 @@ def getStatusTable(date, picked_bmark, picked_loop):
             html.H1("Status as of " + date),
             html.Table(tb),
             html.H1("SLAMP Exps"),
-            html.Table(loops_tb)
+            loops_tb
             ])]
     if picked_bmark != None and picked_loop == None:
         blocks = [html.Div([
             html.H1("SLAMP Exps"),
-            html.Table(loops_tb)
+            loops_tb
             ])]
     if picked_bmark != None and picked_loop != None:
         # dump the json
         try:
-            data = status[picked_bmark]["Exp-slamp"]["loops"][picked_loop]
-            # visualize the blocking_deps
-            blocking_deps = data["blocking_deps"]
-            # for each dep, get dst, src, and type, sort by the type
-            # then render it as a table
-            sorted_deps = sorted(blocking_deps, key=lambda x: x["type"])
-            tb_deps = [html.Tr([html.Th("Type"), html.Th("Src/Dst")] )]
-            for dep in sorted_deps:
-                src = dep["src"]
-                src = highlight(src, LlvmLexer(), HtmlFormatter())
-                dst = dep["dst"]
-                dst = highlight(dst, LlvmLexer(), HtmlFormatter())
-                src = dash_dangerously_set_inner_html.DangerouslySetInnerHTML(src)
-                dst = dash_dangerously_set_inner_html.DangerouslySetInnerHTML(dst)
-
-                if "srcId" in dep:
-                    src_block = html.Tr([html.Td(dep["srcId"]), html.Td(src)])
-                else:
-                    src_block = html.Tr(html.Td(src))
-
-                if "dstId" in dep:
-                    dst_block = html.Tr([html.Td(dep["dstId"]), html.Td(dst)])
-                else:
-                    dst_block = html.Tr(html.Td(dst))
-                # put src and dst in one column
-                src_and_dst = html.Td(html.Table([src_block, dst_block]))
-                tb_deps.append(html.Tr([html.Td(dep["type"]), src_and_dst]))
-
-            blocks = [html.Div([html.Table(loops_tb), html.Div(html.Table(tb_deps))])]
+            dep_groups = app._resultProvider.getDepGroups(date, picked_bmark, picked_loop)
+            # summary counts by type first, the deps of a type are only
+            # rendered when picked, see update_deps_table
+            tb_deps = [html.Tr([html.Th("Type"), html.Th("Count")])]
+            for dep_type, deps in dep_groups.items():
+                tb_deps.append(html.Tr([html.Td(dep_type), html.Td(len(deps))]))
+
+            deps_picker = html.Div([
+                dcc.Dropdown(
+                    id="status-dep-type-picker",
+                    options=[{"label": "%s (%d)" % (dep_type, len(deps)), "value": dep_type}
+                             for dep_type, deps in dep_groups.items()],
+                    value=None
+                    ),
+                dcc.Input(id="status-dep-page", type="number", min=1, step=1, value=1),
+                html.Div(id="status-deps-container")
+                ])
+
+            blocks = [html.Div([loops_tb, html.Div(html.Table(tb_deps)), deps_picker])]
 
         except Exception as e:
             print("Not found")
@@ -1069,22 +1486,22 @@ def display_page(pathname):
         layout = getStatusLayout(app._resultProvider)
         return layout
     if pathname == '/multiCore':
-        layout = getMultiCoreLayout(app._resultProvider)
+        layout = app._resultProvider.getCachedLayout(pathname, getMultiCoreLayout)
         return layout
     elif pathname == '/realSpeedup':
         layout = getRealSpeedupLayout(app._resultProvider)
         return layout
     elif pathname == '/estimatedSpeedup':
-        layout = getEstimatedSpeedupLayout(app._resultProvider)
+        layout = app._resultProvider.getCachedLayout(pathname, getEstimatedSpeedupLayout)
         return layout
     elif pathname == '/estimatedSpeedup-exp3':
-        layout = getEstimatedSpeedupLayoutExp3(app._resultProvider)
+        layout = app._resultProvider.getCachedLayout(pathname, getEstimatedSpeedupLayoutExp3)
         return layout
     elif pathname == '/coverage':
         layout = getCoverageDatePickerLayout()
         return layout
     elif pathname == '/comparePrivateer':
-        layout = getComparePrivateerLayout(app._resultProvider)
+        layout = app._resultProvider.getCachedLayout(pathname, getComparePrivateerLayout)
         return layout
     elif pathname.startswith("/bmark_"):
         bmark = pathname.split("_")[1]
@@ -1095,10 +1512,90 @@ def display_page(pathname):
     # You could also return a 404 "URL not found" page here
 
 
-if __name__ == '__main__':
-    cpf_root = parseArgs()
-    result_path = os.path.join(cpf_root, "./results/")
-    app._resultProvider = ResultProvider(result_path)
+# pages whose layout is cached by ResultProvider.getCachedLayout
+CACHED_PAGES = ['/multiCore', '/estimatedSpeedup', '/estimatedSpeedup-exp3', '/comparePrivateer']
+
+
+# run fn on each item, in the executor if given, and print how long the
+# stage took. A failing item is counted and does not stop the others.
+def runPrewarmStage(name, fn, items, executor=None):
+    start = time.perf_counter()
+    if executor is not None:
+        futures = [executor.submit(fn, item) for item in items]
+
+    failed = 0
+    for i, item in enumerate(items):
+        try:
+            if executor is None:
+                fn(item)
+            else:
+                futures[i].result()
+        except Exception as e:
+            failed += 1
+            print("prewarm: %s %s failed: %r" % (name, item, e))
+
+    print("prewarm: %-10s %5d done %5d failed %8.2fs" % (
+        name, len(items) - failed, failed, time.perf_counter() - start))
+
+
+# Build the run catalogue, memos, run tables, status indexes, coverage CDFs
+# and cached page layouts of all runs, so that the first requests after a
+# restart are served from the caches. Runs are walked by workers threads,
+# the coverage of the runs is solved by workers processes.
+def prewarm(resultProvider, workers=8):
+    start = time.perf_counter()
+    runs = resultProvider.getRuns()
+    print("prewarm: %-10s %5d found %14s %8.2fs" % ("runs", len(runs), "", time.perf_counter() - start))
+    runPrewarmStage("memos", resultProvider.getMemo, runs)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+        runPrewarmStage("tables", resultProvider.buildRunTable, runs, pool)
+        runPrewarmStage("status", resultProvider.buildStatusCaches, runs, pool)
+
+    directories = [os.path.join(resultProvider._path, date) for date in runs]
+    directories = [directory for directory in directories
+                   if os.path.isfile(os.path.join(directory, "coverage.json"))]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        runPrewarmStage("coverage", computeCdfs, directories, pool)
+
+    runPrewarmStage("figures", display_page, CACHED_PAGES)
+    print("prewarm: total %8.2fs" % (time.perf_counter() - start))
+
+
+def getDefaultCacheDir(root_path):
+    name = hashlib.sha1(os.path.abspath(root_path).encode()).hexdigest()[:12]
+    # one per user, the cache directory of another user is not writable
+    return os.path.join(tempfile.gettempdir(), "AutoParVisualizer-%d-%s" % (os.getuid(), name))
+
+
+# Set up the provider and layout of the app, also used by wsgi.py. Each
+# server process calls it once.
+def setupApp(root_path, cache_mb=512, stream_mb=64, indexer=True, cache_dir=None,
+             load_workers=8, cdf_workers=1, log_spans=False, profile=None, profile_dir=None,
+             profile_min_ms=10, precision=4, typed_arrays="auto", compress=True):
+    result_path = os.path.join(root_path, "./results/")
+    if cache_dir is None:
+        cache_dir = getDefaultCacheDir(root_path)
+    sharedCache = SharedCache(os.path.join(cache_dir, "cache.sqlite"))
+    app._resultProvider = ResultProvider(result_path, cache_mb * 1024 * 1024,
+                                         stream_mb * 1024 * 1024, sharedCache,
+                                         load_workers, cdf_workers)
+    if indexer:
+        app._resultProvider.startIndexer()
+    registerCoverageCallback(getBackgroundManager(cache_dir))
+    # timings of the callbacks and requests, served on /metrics
+    ResultMetrics.instrumentCallbacks(app)
+    ResultMetrics.installServer(app.server, log_spans)
+    if profile is not None:
+        if profile_dir is None:
+            profile_dir = os.path.join(cache_dir, "profiles")
+        profiler = ResultProfiler.RequestProfiler(profile, profile_dir, profile_min_ms / 1000)
+        ResultProfiler.installServer(app.server, profiler)
+    # compact figures and compressed responses
+    ResponseEncoding.configure(precision if precision is None or precision >= 0 else None,
+                               {"auto": None, "on": True, "off": False}[typed_arrays])
+    if compress:
+        ResponseEncoding.installCompression(app.server)
 
     app.layout = html.Div([
         dcc.Location(id='url', refresh=False),
@@ -1118,4 +1615,49 @@ if __name__ == '__main__':
         html.Div(id='page-content')
     ])
 
-    app.run_server(debug=False, host='0.0.0.0')
+    return app
+
+
+# serve with several gunicorn worker processes, each one sets up its own app
+def runGunicorn(args):
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        print("Running more than one worker requires gunicorn (pip3 install gunicorn)")
+        sys.exit(1)
+
+    class VisualizerApplication(BaseApplication):
+
+        def load_config(self):
+            self.cfg.set("bind", "0.0.0.0:%d" % args.port)
+            self.cfg.set("workers", args.workers)
+            self.cfg.set("threads", 4)
+            self.cfg.set("timeout", 300)
+
+        def load(self):
+            return setupApp(args.root_path, args.cache_mb, args.stream_mb,
+                            not args.no_indexer, args.cache_dir,
+                            args.load_workers, args.cdf_workers, args.log_spans,
+                            args.profile, args.profile_dir, args.profile_min_ms,
+                            args.precision, args.typed_arrays, not args.no_compress).server
+
+    VisualizerApplication().run()
+
+
+if __name__ == '__main__':
+    args = parseArgs()
+    # gunicorn workers set up their own app, the one of this process only
+    # builds the caches
+    serve = not args.build_cache
+    setupApp(args.root_path, args.cache_mb, args.stream_mb,
+             serve and args.workers <= 1 and not args.no_indexer, args.cache_dir,
+             args.load_workers, args.cdf_workers, args.log_spans,
+             args.profile, args.profile_dir, args.profile_min_ms,
+             args.precision, args.typed_arrays, not args.no_compress)
+    if args.prewarm or args.build_cache:
+        prewarm(app._resultProvider, args.load_workers)
+
+    if serve and args.workers > 1:
+        runGunicorn(args)
+    elif serve:
+        app.run_server(debug=False, host='0.0.0.0', port=args.port)
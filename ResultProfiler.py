@@ -0,0 +1,213 @@
+# Python 3
+#
+# Profiling of the requests of the result presenter
+#
+# Every request, i.e. every page route and Dash callback, is profiled on
+# its own, either with cProfile ("cprofile", written as .pstats files) or by
+# a sampling profiler ("sample", written as collapsed stacks for
+# flamegraph.pl or speedscope). The sampler only looks at the stacks of the
+# request threads every few milliseconds, so it is cheap enough to keep on
+# in production. /profiles lists the slowest recent requests with links to
+# their profiles.
+
+import os
+import io
+import sys
+import time
+import html
+import pstats
+import cProfile
+import threading
+import collections
+import ResultMetrics
+
+PROFILE_MODES = ["cprofile", "sample"]
+
+# requests of these routes are never profiled
+SKIPPED_PREFIXES = ("/_dash-component-suites", "/_dash-layout", "/_dash-dependencies",
+                    "/_favicon", "/assets", "/metrics", "/profiles")
+
+
+# Samples the stacks of the registered threads, {stack: samples} of each
+class StackSampler:
+
+    def __init__(self, interval=0.005):
+        self._interval = interval
+        self._stacks = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, ident):
+        with self._lock:
+            self._stacks[ident] = collections.Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="StackSampler", daemon=True)
+                self._thread.start()
+
+    def stop(self, ident):
+        with self._lock:
+            return self._stacks.pop(ident, collections.Counter())
+
+    @staticmethod
+    def getStack(frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append("%s:%s" % (os.path.basename(code.co_filename), code.co_name))
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def _run(self):
+        while True:
+            time.sleep(self._interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, stacks in self._stacks.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        stacks[self.getStack(frame)] += 1
+
+
+class RequestProfiler:
+
+    # requests faster than minSeconds are not written, the profiles of the
+    # last keep requests written are listed and older ones are deleted
+    def __init__(self, mode, profileDir, minSeconds=0.01, keep=200):
+        if mode not in PROFILE_MODES:
+            raise ValueError("Unknown profile mode " + mode)
+        self._mode = mode
+        self._profileDir = profileDir
+        self._minSeconds = minSeconds
+        self._recent = collections.deque(maxlen=keep)
+        self._local = threading.local()
+        self._sampler = StackSampler() if mode == "sample" else None
+        self._lock = threading.Lock()
+        self._count = 0
+        os.makedirs(profileDir, exist_ok=True)
+
+    def begin(self):
+        self._local.start = time.perf_counter()
+        self._local.profile = None
+        if self._sampler is not None:
+            self._sampler.start(threading.get_ident())
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # another profiler is active in this thread
+            return
+        self._local.profile = profile
+
+    def end(self, route):
+        start = getattr(self._local, "start", None)
+        if start is None:
+            return
+        self._local.start = None
+        seconds = time.perf_counter() - start
+
+        if self._sampler is not None:
+            stacks = self._sampler.stop(threading.get_ident())
+        else:
+            profile = self._local.profile
+            if profile is None:
+                return
+            profile.disable()
+        if seconds < self._minSeconds:
+            return
+
+        with self._lock:
+            self._count += 1
+            count = self._count
+        # the workers of a server share profileDir
+        name = "%s-%d-%05d-%s" % (time.strftime("%Y%m%d-%H%M%S"), os.getpid(), count,
+                               "".join(c if c.isalnum() else "_" for c in route).strip("_")[:80])
+        if self._sampler is not None:
+            name += ".collapsed"
+            with open(os.path.join(self._profileDir, name), 'w') as fd:
+                for stack, samples in stacks.most_common():
+                    fd.write("%s %d\n" % (stack, samples))
+        else:
+            name += ".pstats"
+            profile.dump_stats(os.path.join(self._profileDir, name))
+
+        with self._lock:
+            dropped = self._recent[0] if len(self._recent) == self._recent.maxlen else None
+            self._recent.append({"route": route, "seconds": seconds, "time": time.time(),
+                                 "file": name})
+        if dropped is not None:
+            try:
+                os.remove(os.path.join(self._profileDir, dropped["file"]))
+            except OSError:
+                pass
+
+    def getSlowest(self, limit=50):
+        with self._lock:
+            recent = list(self._recent)
+        return sorted(recent, key=lambda x: x["seconds"], reverse=True)[:limit]
+
+    # path of a profile written by this profiler, None otherwise
+    def getPath(self, name):
+        if os.path.basename(name) != name or not name.endswith((".pstats", ".collapsed")):
+            return None
+        path = os.path.join(self._profileDir, name)
+        return path if os.path.isfile(path) else None
+
+
+# top functions of a .pstats file by cumulative time
+def formatPstats(path, limit=60):
+    out = io.StringIO()
+    stats = pstats.Stats(path, stream=out)
+    stats.sort_stats("cumulative").print_stats(limit)
+    return out.getvalue()
+
+
+def getProfilesPage(profiler):
+    rows = []
+    for record in profiler.getSlowest():
+        links = ['<a href="/profiles/%s">download</a>' % html.escape(record["file"])]
+        if record["file"].endswith(".pstats"):
+            links.append('<a href="/profiles/%s?format=text">summary</a>' % html.escape(record["file"]))
+        rows.append("<tr><td>%.1f</td><td>%s</td><td>%s</td><td>%s</td></tr>" % (
+            record["seconds"] * 1000, html.escape(record["route"]),
+            time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(record["time"])), " ".join(links)))
+    return ("<html><head><title>Slowest requests</title></head><body>"
+            "<h1>Slowest recent requests</h1><table>"
+            "<tr><th>ms</th><th>Route</th><th>Time</th><th>Profile</th></tr>%s"
+            "</table></body></html>" % "".join(rows))
+
+
+# Profile the requests of a Flask server and add the /profiles routes
+def installServer(server, profiler):
+    import flask
+
+    if "autopar_profiles" in server.view_functions:
+        return
+
+    def isSkipped():
+        return flask.request.path.startswith(SKIPPED_PREFIXES)
+
+    @server.before_request
+    def startProfile():
+        if not isSkipped():
+            profiler.begin()
+
+    @server.after_request
+    def stopProfile(response):
+        if not isSkipped():
+            profiler.end(ResultMetrics.getRoute(flask.request))
+        return response
+
+    def listProfiles():
+        return getProfilesPage(profiler)
+
+    def getProfile(name):
+        path = profiler.getPath(name)
+        if path is None:
+            flask.abort(404)
+        if flask.request.args.get("format") == "text" and name.endswith(".pstats"):
+            return flask.Response(formatPstats(path), mimetype="text/plain")
+        return flask.send_file(path, as_attachment=True, download_name=name)
+
+    server.add_url_rule("/profiles", "autopar_profiles", listProfiles)
+    server.add_url_rule("/profiles/<name>", "autopar_profile", getProfile)
@@ -0,0 +1,247 @@
+# Python 3
+#
+# Columnar tables of the results of a run
+#
+# All status files of a run are flattened once into NumPy columns, stored as
+# one .npz file inside the run directory and read back whole on later loads,
+# so that no file stays open per run.
+# Queries are then vectorized filters over the columns instead of walking
+# the nested status dicts.
+#
+# runs:  one row per (status file, bmark, experiment)
+# loops: one row per loop of an experiment
+# cores: one row per core count of RealSpeedup.para_time_dict
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+import collections
+import numpy as np
+import ResultMetrics
+from ResultCache import makeShared
+
+# bump when the schema changes to invalidate old tables
+TABLE_VERSION = 2
+TABLE_FILE_PREFIX = ".result_table."
+
+RUN_COLUMNS = [("bmark", str), ("experiment", str), ("per_bmark", bool),
+               ("has_loops", bool), ("speedup", np.float64),
+               ("seq_time", np.float64), ("para_time", np.float64)]
+LOOP_COLUMNS = [("bmark", str), ("experiment", str), ("per_bmark", bool),
+                ("loop", str), ("selected", np.int8), ("exec_coverage", np.float64),
+                ("loop_speedup", np.float64), ("loop_stage", str), ("has_stage", bool),
+                ("covered_lcDeps", np.float64), ("total_lcDeps", np.float64),
+                ("lcDeps_coverage", np.float64)]
+CORE_COLUMNS = [("bmark", str), ("cores", np.int64), ("para_time", np.float64)]
+
+TABLES = {"runs": RUN_COLUMNS, "loops": LOOP_COLUMNS, "cores": CORE_COLUMNS}
+
+
+def _num(obj, key):
+    value = obj.get(key)
+    if isinstance(value, (int, float)):
+        return float(value)
+    return np.nan
+
+
+class RunTable:
+
+    def __init__(self, columns):
+        self.runs = columns["runs"]
+        self.loops = columns["loops"]
+        self.cores = columns["cores"]
+
+    # Boolean mask of the rows of a table matching all the conditions, a
+    # list value matches any of its elements
+    @staticmethod
+    def select(table, **conditions):
+        mask = np.ones(len(next(iter(table.values()))), dtype=bool)
+        for name, value in conditions.items():
+            if isinstance(value, (list, tuple, set)):
+                mask &= np.isin(table[name], list(value))
+            else:
+                mask &= table[name] == value
+        return mask
+
+
+def _addExperiments(rows, bmark, status, per_bmark):
+    for exp, exp_status in status.items():
+        # pass flags are plain booleans, empty experiments have no results
+        if not isinstance(exp_status, dict) or not exp_status:
+            continue
+
+        loops = exp_status.get("loops")
+        rows["runs"].append((bmark, exp, per_bmark, "loops" in exp_status,
+                             _num(exp_status, "speedup"),
+                             _num(exp_status, "seq_time"),
+                             _num(exp_status, "para_time")))
+
+        if isinstance(loops, dict):
+            for loop, loop_info in loops.items():
+                if not isinstance(loop_info, dict):
+                    continue
+                if "selected" in loop_info:
+                    selected = 1 if loop_info["selected"] else 0
+                else:
+                    selected = -1
+                stage = loop_info.get("loop_stage")
+                rows["loops"].append((bmark, exp, per_bmark, loop, selected,
+                                      _num(loop_info, "exec_coverage"),
+                                      _num(loop_info, "loop_speedup"),
+                                      str(stage) if stage is not None else "",
+                                      "loop_stage" in loop_info,
+                                      _num(loop_info, "covered_lcDeps"),
+                                      _num(loop_info, "total_lcDeps"),
+                                      _num(loop_info, "lcDeps_coverage")))
+
+        if exp == "RealSpeedup" and not per_bmark:
+            para_time_dict = exp_status.get("para_time_dict")
+            if isinstance(para_time_dict, dict):
+                for cores, para_time in para_time_dict.items():
+                    rows["cores"].append((bmark, int(cores), float(para_time)))
+
+
+# flatten status.json and status_<bmark>.json of a run into columns
+def ingestRun(date_path, status_files):
+    rows = {name: [] for name in TABLES}
+    for file_bmark, filename in status_files:
+        with open(os.path.join(date_path, filename), 'r') as fd:
+            status = json.load(fd)
+            ResultMetrics.countBytes("tables", fd.tell())
+
+        if filename == "status.json":
+            for bmark, bmark_status in status.items():
+                if isinstance(bmark_status, dict):
+                    _addExperiments(rows, bmark, bmark_status, False)
+        else:
+            _addExperiments(rows, file_bmark, status, True)
+
+    columns = {}
+    for name, schema in TABLES.items():
+        values = list(zip(*rows[name])) if rows[name] else [[] for _ in schema]
+        columns[name] = {col: np.array(values[i], dtype=dtype)
+                         for i, (col, dtype) in enumerate(schema)}
+    return columns
+
+
+def saveColumns(table_path, columns):
+    # write to a temporary file and rename it, another process may have
+    # finished the same table first
+    tmp_path = None
+    try:
+        with tempfile.NamedTemporaryFile(dir=os.path.dirname(table_path),
+                                         prefix=TABLE_FILE_PREFIX + "tmp", delete=False) as fd:
+            tmp_path = fd.name
+            np.savez(fd, **{"%s.%s" % (name, col): values
+                            for name, table in columns.items()
+                            for col, values in table.items()})
+        makeShared(tmp_path)
+        os.replace(tmp_path, table_path)
+        return True
+    except OSError:
+        # run directory not writable, the table only lives in memory
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return False
+
+
+def loadColumns(table_path):
+    columns = {}
+    with np.load(table_path, allow_pickle=False) as data:
+        for name, schema in TABLES.items():
+            columns[name] = {col: data["%s.%s" % (name, col)] for col, _ in schema}
+    return columns
+
+
+def getColumnBytes(columns):
+    return sum(values.nbytes for table in columns.values() for values in table.values())
+
+
+class TableStore:
+
+    # maxBytes caps the total size of the columns kept in memory, the least
+    # recently used tables are evicted first
+    def __init__(self, statusIndex, maxBytes=256 * 1024 * 1024):
+        self._statusIndex = statusIndex
+        self._maxBytes = maxBytes
+        self._curBytes = 0
+        self._tables = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    # fingerprint of all status files of a run
+    def getKey(self, date_path, status_files):
+        h = hashlib.sha1(str(TABLE_VERSION).encode())
+        for _, filename in status_files:
+            st = os.stat(os.path.join(date_path, filename))
+            h.update(("%s:%d:%d;" % (filename, st.st_size, st.st_mtime_ns)).encode())
+        return h.hexdigest()
+
+    def get(self, date_path):
+        status_files = self._statusIndex.listStatusFiles(date_path)
+        key = self.getKey(date_path, status_files)
+        with self._lock:
+            entry = self._tables.get(date_path)
+            if entry is not None and entry[0] == key:
+                self._tables.move_to_end(date_path)
+                ResultMetrics.countCache("tables", "hit")
+                return entry[1]
+
+        columns = self._loadOrBuild(date_path, status_files, key)
+        table = RunTable(columns)
+        size = getColumnBytes(columns)
+        with self._lock:
+            old = self._tables.pop(date_path, None)
+            if old is not None:
+                self._curBytes -= old[2]
+            # a single table larger than the cap is not kept
+            if size <= self._maxBytes:
+                self._tables[date_path] = (key, table, size)
+                self._curBytes += size
+                while self._curBytes > self._maxBytes:
+                    _, (_, _, oldSize) = self._tables.popitem(last=False)
+                    self._curBytes -= oldSize
+        return table
+
+    # write the table of a run to disk if it is missing, without keeping it
+    # in memory
+    def build(self, date_path):
+        status_files = self._statusIndex.listStatusFiles(date_path)
+        key = self.getKey(date_path, status_files)
+        if not os.path.isfile(self._getPath(date_path, key)):
+            self._loadOrBuild(date_path, status_files, key)
+
+    @staticmethod
+    def _getPath(date_path, key):
+        return os.path.join(date_path, TABLE_FILE_PREFIX + key + ".npz")
+
+    def _loadOrBuild(self, date_path, status_files, key):
+        table_path = self._getPath(date_path, key)
+        try:
+            columns = loadColumns(table_path)
+            ResultMetrics.countCache("tables", "disk")
+        except (OSError, ValueError, KeyError):
+            ResultMetrics.countCache("tables", "miss")
+            columns = ingestRun(date_path, status_files)
+            if saveColumns(table_path, columns):
+                self._removeStale(date_path, table_path)
+        return columns
+
+    # tables of older versions of the status files, temporary files of
+    # other writers are left alone
+    def _removeStale(self, date_path, table_path):
+        for filename in os.listdir(date_path):
+            path = os.path.join(date_path, filename)
+            if filename.startswith(TABLE_FILE_PREFIX + "tmp"):
+                continue
+            if filename.startswith(TABLE_FILE_PREFIX) and path != table_path:
+                # tables of version 1 were directories of .npy files
+                if os.path.isdir(path):
+                    shutil.rmtree(path, ignore_errors=True)
+                else:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
@@ -0,0 +1,64 @@
+# Python 3
+#
+# Vectorized speedup aggregation shared by the speedup pages
+#
+# Values are NumPy arrays, a missing value is NaN. Speedups are only
+# computed from positive times and geomeans only over positive finite
+# speedups, so that a zero, negative or missing result never turns a whole
+# bar or geomean into NaN.
+
+import numpy as np
+
+
+def _asArray(values):
+    return np.asarray(values, dtype=np.float64)
+
+
+# mask of the values a geomean is taken over
+def validMask(values):
+    values = _asArray(values)
+    with np.errstate(invalid='ignore'):
+        return np.isfinite(values) & (values > 0)
+
+
+# Geometric mean of the valid values along axis, 0 where there is none.
+# Computed in log space so that long products do not overflow.
+def geomean(values, axis=None):
+    values = _asArray(values)
+    mask = validMask(values)
+    logs = np.log(np.where(mask, values, 1.0))
+    count = mask.sum(axis=axis)
+    total = logs.sum(axis=axis)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result = np.where(count > 0, np.exp(total / np.maximum(count, 1)), 0.0)
+    return float(result) if np.ndim(result) == 0 else result
+
+
+# seq_times / para_times broadcast against each other, e.g. seq_times of
+# shape (bmarks, 1) against para_times of shape (bmarks, cores). NaN where
+# either time is missing or not positive.
+def speedups(seq_times, para_times):
+    seq_times = _asArray(seq_times)
+    para_times = _asArray(para_times)
+    with np.errstate(invalid='ignore'):
+        valid = validMask(seq_times) & validMask(para_times)
+    seq_times, para_times = np.broadcast_arrays(seq_times, para_times)
+    return np.divide(seq_times, para_times, out=np.full(valid.shape, np.nan), where=valid)
+
+
+# rows of different lengths padded with NaN into one (rows, longest) array
+def padRows(rows):
+    width = max((len(row) for row in rows), default=0)
+    result = np.full((len(rows), width), np.nan)
+    for i, row in enumerate(rows):
+        result[i, :len(row)] = row
+    return result
+
+
+# names and values sorted by value, ties by name, with the geomean of the
+# values appended as the last bar
+def sortWithGeomean(names, values, label="geomean"):
+    names = np.asarray(names, dtype=str)
+    values = _asArray(values)
+    order = np.lexsort((names, values))
+    return names[order].tolist() + [label], values[order].tolist() + [geomean(values)]
@@ -3,18 +3,44 @@
 
 import os
 import json
+import time
+import fcntl
+import contextlib
 import itertools
+import hashlib
+import tempfile
+import collections
+import concurrent.futures
+import numpy as np
 import plotly.graph_objects as go
+import ResultMetrics
+from ResultCache import makeShared
+
+BMARK_FILES = ["coverage.json", "sccs.json", "compatible.json"]
+
+# CDFs of a results directory are cached next to coverage.json
+CDF_CACHE_FILE = "coverage_cdf.npz"
+# held while the CDFs of a directory are computed
+CDF_LOCK_FILE = ".coverage_cdf.lock"
+# bump when the CDF computation changes to invalidate old caches
+CDF_CACHE_VERSION = 1
+# number of processes solving the benchmarks of a directory, 1 solves them
+# in the calling process
+CDF_WORKERS = 1
+
 
 def openBmarkFileFiles(directory):
     with open(os.path.join(directory, "coverage.json"), 'r') as fd:
         coverages = json.load(fd)
+        ResultMetrics.countBytes("coverage", fd.tell())
 
     with open(os.path.join(directory, "sccs.json"), 'r') as fd:
         sccs = json.load(fd)
+        ResultMetrics.countBytes("coverage", fd.tell())
 
     with open(os.path.join(directory, "compatible.json"), 'r') as fd:
         compatibles = json.load(fd)
+        ResultMetrics.countBytes("coverage", fd.tell())
 
     return coverages, sccs, compatibles
 
@@ -40,44 +66,318 @@ def isCompatible(compatible, s):
             return False
     return True
 
+
+# Budget of the max clique searches of one benchmark, after which the best
+# clique found so far (at least as good as the greedy one) is returned and
+# marked as approximate
+SOLVER_NODE_BUDGET = 200000
+SOLVER_TIME_BUDGET = 5.0
+
+# coverage: total coverage of the clique
+# clique: sorted loop indexes of the clique
+# exact: False if the search ran out of budget
+CliqueResult = collections.namedtuple("CliqueResult", ["coverage", "clique", "exact"])
+
+
+class _BudgetExceeded(Exception):
+    pass
+
+
+# Nodes and time left to the searches sharing it, exhausted once either
+# runs out
+class SolverBudget:
+
+    def __init__(self, nodeBudget=None, timeBudget=None):
+        self.nodes = SOLVER_NODE_BUDGET if nodeBudget is None else nodeBudget
+        self.deadline = time.monotonic() + (SOLVER_TIME_BUDGET if timeBudget is None else timeBudget)
+        self.exhausted = False
+
+    def spend(self):
+        self.nodes -= 1
+        if self.nodes < 0 or (self.nodes & 0xff == 0 and time.monotonic() > self.deadline):
+            self.exhausted = True
+            raise _BudgetExceeded()
+
+
+def iterBits(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+# build adjacency bitsets from compatible.json, adj[i] has bit j set iff
+# loop i and loop j are compatible
+def buildAdjacency(compatible, numLoops):
+    adj = [0] * numLoops
+    for pair in compatible:
+        i, j = pair[0], pair[1]
+        if i == j or i >= numLoops or j >= numLoops:
+            continue
+        adj[i] |= 1 << j
+        adj[j] |= 1 << i
+    return adj
+
+
+# clique grown greedily by coverage from the seed clique
+def greedyClique(coverages, adj, candidates, clique=0):
+    allowed = candidates & ~clique
+    for i in iterBits(clique):
+        allowed &= adj[i]
+    for i in sorted(iterBits(allowed), key=lambda i: coverages[i], reverse=True):
+        if allowed >> i & 1:
+            clique |= 1 << i
+            allowed &= adj[i]
+    return clique
+
+
+def cliqueCoverage(coverages, clique):
+    return sum(coverages[i] for i in iterBits(clique))
+
+
+# Weighted Bron-Kerbosch with pivoting. A branch is pruned when the
+# coverage of the current clique plus all its candidates cannot beat the
+# best clique found so far. incumbent, if given, is a known clique among
+# idxs, grown greedily into the initial lower bound. budget, if given, is a
+# SolverBudget shared with other searches, once it is exhausted only the
+# greedy cliques are returned.
+def findMaxClique(coverages, adj, idxs, nodeBudget=None, timeBudget=None,
+                  incumbent=None, budget=None):
+    if budget is None:
+        budget = SolverBudget(nodeBudget, timeBudget)
+
+    # loops without coverage never increase the coverage of a clique
+    candidates = 0
+    for i in idxs:
+        if coverages[i] > 0:
+            candidates |= 1 << i
+
+    best = [greedyClique(coverages, adj, candidates), 0]
+    best[1] = cliqueCoverage(coverages, best[0])
+    if incumbent:
+        clique = 0
+        for i in incumbent:
+            clique |= 1 << i
+        clique = greedyClique(coverages, adj, candidates, clique & candidates)
+        coverage = cliqueCoverage(coverages, clique)
+        if coverage > best[1]:
+            best[0], best[1] = clique, coverage
+    if budget.exhausted:
+        return CliqueResult(best[1], list(iterBits(best[0])), False)
+
+    def expand(clique, coverage, P, X):
+        budget.spend()
+
+        if coverage > best[1]:
+            best[0], best[1] = clique, coverage
+        if P == 0:
+            return
+
+        bound = coverage
+        for i in iterBits(P):
+            bound += coverages[i]
+        if bound <= best[1]:
+            return
+
+        # pivot on the vertex covering the most candidates
+        pivot = max(iterBits(P | X), key=lambda u: bin(P & adj[u]).count("1"))
+        branches = sorted(iterBits(P & ~adj[pivot]), key=lambda i: coverages[i], reverse=True)
+        for v in branches:
+            bit = 1 << v
+            expand(clique | bit, coverage + coverages[v], P & adj[v], X & adj[v])
+            P &= ~bit
+            X |= bit
+
+    exact = True
+    try:
+        expand(0, 0, candidates, 0)
+    except _BudgetExceeded:
+        exact = False
+
+    return CliqueResult(best[1], list(iterBits(best[0])), exact)
+
+
 # in the loops allowed, find a set of loops with max coverage
 # and compatible with each other
 def findMaxCoverage(coverages, compatible, idxs):
-    # TODO: a max clique problem: ebk algorithm
-    maxCoverage = 0
-    curLen = len(idxs)
-    if curLen == 0:
+    if len(idxs) == 0:
         return 0
 
-    while curLen > 0:
-        for s in list(itertools.combinations(idxs, curLen)):
-            if (isCompatible(compatible, s)):
-                curCoverage = 0
-                for i in s:
-                    curCoverage += coverages[i]
-                maxCoverage = max(maxCoverage, curCoverage)
-        # try smaller set
-        curLen -= 1
-    
-    return maxCoverage
+    adj = buildAdjacency(compatible, len(coverages))
+    return findMaxClique(coverages, adj, idxs).coverage
+
+
+# Max coverage for every threshold in one sweep. The eligible loops only
+# grow with the threshold, so loops are sorted once by their largest SCC and
+# the clique is only re-solved when new loops become eligible, starting from
+# the previous clique. All solves share one SolverBudget, once it is
+# exhausted the remaining thresholds get the greedy clique grown from the
+# previous one. Returns the CDF and whether all solves were exact.
+def sweepCdf(coverages, sccs, adj, thresholds=range(101), budget=None):
+    if budget is None:
+        budget = SolverBudget()
+    order = sorted(range(len(sccs)), key=lambda idx: sccs[idx][0])
+    pos = 0
+    idxs = []
+    result = CliqueResult(0, [], True)
+    exact = True
+
+    coverageCdf = []
+    for thres in thresholds:
+        changed = False
+        while pos < len(order) and sccs[order[pos]][0] <= thres:
+            idxs.append(order[pos])
+            pos += 1
+            changed = True
+
+        # forward fill when no new loop is eligible
+        if changed:
+            result = findMaxClique(coverages, adj, idxs, incumbent=result.clique, budget=budget)
+            exact = exact and result.exact
+        coverageCdf.append(result.coverage)
+
+    return coverageCdf, exact
+
 
+# CDF of one benchmark, run in a worker process by getCdfs
+def solveBmark(coverages, sccs, compatible):
+    adj = buildAdjacency(compatible, len(coverages))
+    return sweepCdf(coverages, sccs, adj)
+
+
+# approxBmarks, if given, collects the benchmarks for which at least one
+# threshold ran out of solver budget. With more than one worker the
+# benchmarks are solved in a process pool, the result is the same.
+# progress, if given, is called with (solved, total) after each benchmark.
+@ResultMetrics.timed("VisualizeCoverage.getCdfs")
+def getCdfs(bmark_coverage, bmark_sccs, bmark_compatible, approxBmarks=None, workers=None,
+            progress=None):
+    if workers is None:
+        workers = CDF_WORKERS
+
+    bmarks = sorted(bmark_sccs)
+    jobs = []
+    for bmark in bmarks:
+        jobs.append((bmark_coverage[bmark.replace("-ignorefn", "")],
+                     bmark_sccs[bmark],
+                     bmark_compatible[bmark.replace("-ignorefn", "")]))
+
+    results = []
+    if workers > 1 and len(jobs) > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            for result in pool.map(solveBmark, *zip(*jobs)):
+                results.append(result)
+                if progress is not None:
+                    progress(len(results), len(jobs))
+    else:
+        for job in jobs:
+            results.append(solveBmark(*job))
+            if progress is not None:
+                progress(len(results), len(jobs))
 
-def getCdfs(bmark_coverage, bmark_sccs, bmark_compatible):
     bmarkCdf = {}
-    for bmark in sorted(bmark_sccs):
-        sccs = bmark_sccs[bmark]
-        compatible = bmark_compatible[bmark.replace("-ignorefn", "")]
-        coverages = bmark_coverage[bmark.replace("-ignorefn", "")]
-        
-        coverageCdf = []
-        for thres in range(101):
-            idxs = filterGoodLoops(sccs, thres)
-            maxCoverage = findMaxCoverage(coverages, compatible, idxs)
-            coverageCdf.append(maxCoverage)
+    for bmark, (coverageCdf, exact) in zip(bmarks, results):
+        if not exact and approxBmarks is not None:
+            approxBmarks.add(bmark)
         bmarkCdf[bmark] = coverageCdf
 
     return bmarkCdf
 
+
+# fingerprint of the input files, changes whenever one of them is rewritten
+def getCdfCacheKey(directory):
+    h = hashlib.sha1(str(CDF_CACHE_VERSION).encode())
+    for filename in BMARK_FILES:
+        st = os.stat(os.path.join(directory, filename))
+        h.update(("%s:%d:%d;" % (filename, st.st_size, st.st_mtime_ns)).encode())
+    return h.hexdigest()
+
+
+def loadCdfCache(directory, key):
+    cache_path = os.path.join(directory, CDF_CACHE_FILE)
+    try:
+        with np.load(cache_path, allow_pickle=False) as cache:
+            if str(cache["key"]) != key:
+                return None
+            bmarkCdf = {}
+            for bmark, cdf in zip(cache["bmarks"], cache["cdfs"]):
+                bmarkCdf[str(bmark)] = cdf.tolist()
+            approxBmarks = set(str(bmark) for bmark in cache["approx"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+    return bmarkCdf, approxBmarks
+
+
+# write to a temporary file and rename it, so that concurrent readers
+# never see a partial cache
+def saveCdfCache(directory, key, bmarkCdf, approxBmarks):
+    bmarks = list(bmarkCdf)
+    if bmarks:
+        cdfs = np.array([bmarkCdf[bmark] for bmark in bmarks], dtype=np.float64).reshape(len(bmarks), -1)
+    else:
+        cdfs = np.zeros((0, 101))
+    tmp_path = None
+    try:
+        with tempfile.NamedTemporaryFile(dir=directory, prefix=CDF_CACHE_FILE,
+                                         suffix=".tmp", delete=False) as fd:
+            tmp_path = fd.name
+            np.savez_compressed(fd, key=np.array(key),
+                                bmarks=np.array(bmarks, dtype=str),
+                                cdfs=cdfs,
+                                approx=np.array(sorted(approxBmarks), dtype=str))
+        makeShared(tmp_path)
+        os.replace(tmp_path, os.path.join(directory, CDF_CACHE_FILE))
+    except (OSError, ValueError):
+        # results directory not writable or CDFs of different lengths, just
+        # skip caching
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+# Exclusive lock of the CDFs of a directory across threads and processes,
+# nothing is locked if the directory is not writable
+@contextlib.contextmanager
+def lockCdfCache(directory):
+    try:
+        fd = open(os.path.join(directory, CDF_LOCK_FILE), 'a')
+    except OSError:
+        yield
+        return
+    with fd:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+def computeCdfs(directory, useCache=True, workers=None, progress=None):
+    if not useCache:
+        coverages, sccs, compatibles = openBmarkFileFiles(directory)
+        approxBmarks = set()
+        bmarkCdf = getCdfs(coverages, sccs, compatibles, approxBmarks, workers, progress)
+        return bmarkCdf, approxBmarks
+
+    key = getCdfCacheKey(directory)
+    cached = loadCdfCache(directory, key)
+    if cached is not None:
+        ResultMetrics.countCache("cdfs", "hit")
+        return cached
+    ResultMetrics.countCache("cdfs", "miss")
+
+    # concurrent requests for the same directory wait for the first one
+    # and read its cache
+    with lockCdfCache(directory):
+        cached = loadCdfCache(directory, key)
+        if cached is not None:
+            return cached
+
+        bmarkCdf, approxBmarks = computeCdfs(directory, False, workers, progress)
+        saveCdfCache(directory, key, bmarkCdf, approxBmarks)
+    return bmarkCdf, approxBmarks
+
+
 # # Plot Explanation
 # 
 # - Each threshold correspond to the maximum coverage of loops with the
@@ -91,10 +391,11 @@ def getCdfs(bmark_coverage, bmark_sccs, bmark_compatible):
 #   
 # - When multiple loops meet threshold requirement, a max clique algorithm
 #   is run to select the max coverage.
-def getCdfFig(directory, onlyIgnoreFn=False, onlyNotIgnoreFn=False):
-
-    coverages, sccs, compatibles = openBmarkFileFiles(directory)
-    bmarkCdf = getCdfs(coverages, sccs, compatibles)
+#
+# render the figures from the CDFs computed by computeCdfs, the ignorefn
+# views are only a subset of the benchmarks
+@ResultMetrics.timed("VisualizeCoverage.renderCdfFig")
+def renderCdfFig(bmarkCdf, approxBmarks, onlyIgnoreFn=False, onlyNotIgnoreFn=False):
 
     fig = go.Figure()
 
@@ -109,9 +410,11 @@ def getCdfFig(directory, onlyIgnoreFn=False, onlyNotIgnoreFn=False):
         bmarks.append(bmark)
 
     for bmark in bmarks:
+        # the solver ran out of budget, the curve is only a lower bound
+        name = bmark + " (approx.)" if bmark in approxBmarks else bmark
         fig.add_trace(go.Scatter(x=list(range(101)), y=bmarkCdf[bmark],
                                  mode='lines',
-                                 name=bmark))
+                                 name=name))
 
     fig.update_layout(title="Threshold-Coverage:",
                       xaxis_title='Threshold of Largest Sequential SCC (%)',
@@ -134,3 +437,7 @@ def getCdfFig(directory, onlyIgnoreFn=False, onlyNotIgnoreFn=False):
     return fig, bar_fig
 
 
+@ResultMetrics.timed("VisualizeCoverage.getCdfFig")
+def getCdfFig(directory, onlyIgnoreFn=False, onlyNotIgnoreFn=False):
+    bmarkCdf, approxBmarks = computeCdfs(directory)
+    return renderCdfFig(bmarkCdf, approxBmarks, onlyIgnoreFn, onlyNotIgnoreFn)
@@ -0,0 +1,15 @@
+# Python 3
+#
+# WSGI entry point of the visualizer for production servers, e.g.
+#
+#   AUTOPAR_ROOT=PATH/TO/ROOT gunicorn -w 4 -b 0.0.0.0:8050 wsgi:server
+#
+# AUTOPAR_CACHE_DIR optionally sets the local directory of the cache shared
+# by the worker processes
+
+import os
+from ResultPresenter import setupApp
+
+app = setupApp(os.environ["AUTOPAR_ROOT"],
+               cache_dir=os.environ.get("AUTOPAR_CACHE_DIR"))
+server = app.server